@@ -2,29 +2,15 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
+import importlib.util
 import sys
 import os
 
-# Optional imports (graceful fallback)
-try:
-    import folium
-    from streamlit_folium import folium_static
-    FOLIUM_AVAILABLE = True
-except ImportError:
-    FOLIUM_AVAILABLE = False
-
-try:
-    import plotly.express as px
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
-
-try:
-    from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    SKLEARN_AVAILABLE = True
-except ImportError:
-    SKLEARN_AVAILABLE = False
+# Optional imports (graceful fallback); these are slow to import, so they are
+# only looked up here and imported by the views that use them
+FOLIUM_AVAILABLE = all(importlib.util.find_spec(name) for name in ("folium", "streamlit_folium"))
+PLOTLY_AVAILABLE = importlib.util.find_spec("plotly") is not None
+SKLEARN_AVAILABLE = importlib.util.find_spec("sklearn") is not None
 
 # Add src directory to Python path for imports
 root_dir = Path(__file__).parent
@@ -34,6 +20,7 @@ sys.path.insert(0, str(src_dir))
 # Import the assistant
 try:
     from rag.assistant import ClinicalTrialAssistant
+    from rag.pool import get_shared_assistant
     ASSISTANT_AVAILABLE = True
     ASSISTANT_TYPE = "Full RAG Assistant"
 except ImportError as e:
@@ -46,6 +33,18 @@ except ImportError as e:
         ASSISTANT_AVAILABLE = False
         ASSISTANT_TYPE = "None"
 
+from ui.streaming import write_answer_stream
+
+# Precomputed trial similarity (built by the indexer)
+try:
+    from rag.similarity import SimilarityIndex, similarity_path
+    SIMILARITY_AVAILABLE = True
+except ImportError:
+    SIMILARITY_AVAILABLE = False
+
+# Precomputed dataset facet counts (built by the indexer)
+from rag.facets import facets_path, load_facets
+
 # Page configuration
 st.set_page_config(
     page_title="Clinical Trial Assistant",
@@ -83,10 +82,41 @@ st.markdown("""
 # Initialize the assistant
 @st.cache_resource
 def get_assistant():
+    if ASSISTANT_TYPE == "Full RAG Assistant":
+        # Shared by every session in this process (see rag.pool)
+        return get_shared_assistant()
     if ASSISTANT_AVAILABLE:
         return ClinicalTrialAssistant()
     return None
 
+@st.cache_resource
+def load_similarity_index(path, version):
+    return SimilarityIndex.load(path)
+
+def get_similarity_index():
+    """Open the similarity index, reopening it after the indexer rebuilds it."""
+    if not SIMILARITY_AVAILABLE:
+        return None
+    path = similarity_path(root_dir / "data" / "chroma_db")
+    try:
+        version = (path / "meta.json").stat().st_mtime_ns
+    except OSError:
+        return None
+    return load_similarity_index(str(path), version)
+
+@st.cache_resource
+def load_dataset_facets(path, version):
+    return load_facets(path)
+
+def get_dataset_facets():
+    """Facet counts of the whole index, reread after the indexer rewrites them."""
+    path = facets_path(root_dir / "data" / "chroma_db")
+    try:
+        version = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    return load_dataset_facets(str(path), version)
+
 def format_trial_card(trial):
     """Format trial information as a card with metadata badges."""
     return f"""
@@ -138,26 +168,36 @@ def initialize_session_state():
     if "view_mode" not in st.session_state:
         st.session_state.view_mode = "Chat"
 
-def create_trial_visualizations(trials):
-    """Create visualizations from trial data."""
-    if not trials or not PLOTLY_AVAILABLE:
-        st.info("Advanced visualizations require plotly (not available)")
-        return
-    
-    # Convert trials list to DataFrame
-    df = pd.DataFrame(trials)
+def create_trial_visualizations(facets):
+    """Chart the whole dataset from the indexer's precomputed facet counts."""
+    counts = facets["counts"]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Trials", f"{facets['total']:,}")
+    with col2:
+        st.metric("Recruiting", f"{counts['status'].get('Recruiting', 0):,}")
+    with col3:
+        st.metric("Conditions", f"{facets['distinct_conditions']:,}")
     
     # Phase Distribution
-    if 'phase' in df.columns:
-        st.subheader("Trial Phases Distribution")
-        phase_counts = df['phase'].value_counts()
-        st.bar_chart(phase_counts)
+    st.subheader("Trial Phases Distribution")
+    st.bar_chart(pd.Series(counts["phase"], name="trials"))
     
     # Status Distribution
-    if 'status' in df.columns:
-        st.subheader("Trial Status Distribution")
-        status_counts = df['status'].value_counts()
-        st.bar_chart(status_counts)
+    st.subheader("Trial Status Distribution")
+    st.bar_chart(pd.Series(counts["status"], name="trials"))
+    
+    st.subheader("Status by Phase")
+    st.bar_chart(pd.DataFrame.from_dict(facets["crosstabs"]["status_phase"], orient="index").fillna(0))
+    
+    st.subheader("Most Studied Conditions")
+    st.bar_chart(pd.Series(dict(list(counts["condition"].items())[:15]), name="trials"))
+    
+    # Start months summed per year keep the chart readable
+    starts = pd.Series({month: n for month, n in counts["start_month"].items() if month[:4].isdigit()}, dtype=float)
+    if len(starts):
+        st.subheader("Trials Started per Year")
+        st.line_chart(starts.groupby(starts.index.str[:4]).sum())
 
 def create_map_visualization(trials):
     """Create a map visualization of trial locations."""
@@ -165,6 +205,9 @@ def create_map_visualization(trials):
         st.info("Map visualization requires folium (not available)")
         return
         
+    import folium
+    from streamlit_folium import folium_static
+    
     # Create a map centered on the US
     m = folium.Map(location=[37.0902, -95.7129], zoom_start=4)
     
@@ -182,8 +225,17 @@ def create_map_visualization(trials):
 
 def compare_trials(trial1, trial2):
     """Compare two trials and return similarity score."""
+    # Indexed trials: a dot product of precomputed corpus TF-IDF rows
+    index = get_similarity_index()
+    if index is not None:
+        similarity = index.similarity(trial1.get('nct_id'), trial2.get('nct_id'))
+        if similarity is not None:
+            return similarity
+    
     if not SKLEARN_AVAILABLE:
         return 0.5  # Default similarity
+    from sklearn.metrics.pairwise import cosine_similarity
+    from sklearn.feature_extraction.text import TfidfVectorizer
         
     # Create TF-IDF vectors for comparison
     vectorizer = TfidfVectorizer()
@@ -218,8 +270,23 @@ def main():
         )
         
         # Assistant settings
+        search_filters = {}
         if ASSISTANT_AVAILABLE:
             n_results = st.slider("Number of relevant trials", 1, 10, 3)
+            
+            # Structured filters are applied inside the vector search
+            search_phases = st.multiselect(
+                "Limit search to phases",
+                ["Early Phase 1", "Phase 1", "Phase 2", "Phase 3", "Phase 4"]
+            )
+            search_statuses = st.multiselect(
+                "Limit search to statuses",
+                ["Recruiting", "Not yet recruiting", "Active, not recruiting", "Completed", "Terminated"]
+            )
+            if search_phases:
+                search_filters["phase"] = search_phases
+            if search_statuses:
+                search_filters["status"] = search_statuses
         else:
             st.warning("Assistant not available - using demo mode")
             n_results = 3
@@ -272,8 +339,14 @@ def main():
                     if assistant and ASSISTANT_AVAILABLE:
                         try:
                             with st.spinner("Searching trials..."):
-                                response = assistant.query(prompt, n_results=n_results)
-                            st.markdown(response["answer"])
+                                if hasattr(assistant, "query_stream"):
+                                    response = assistant.query_stream(prompt, n_results=n_results,
+                                                                      filters=search_filters)
+                                else:
+                                    response = assistant.query(prompt, n_results=n_results)
+                                    response["answer_stream"] = iter([response["answer"]])
+                            # Render tokens as they arrive
+                            answer = write_answer_stream(response["answer_stream"])
                             
                             trials = response.get("sources", [])
                             filtered_trials = display_trial_filters(trials)
@@ -283,7 +356,7 @@ def main():
                                 
                             st.session_state.messages.append({
                                 "role": "assistant",
-                                "content": response["answer"],
+                                "content": answer,
                                 "sources": response.get("sources", [])
                             })
                         except Exception as e:
@@ -338,7 +411,9 @@ def main():
             # System status
             st.markdown("### System Status")
             st.success("✅ Streamlit" if True else "❌ Streamlit")
-            if ASSISTANT_AVAILABLE:
+            if ASSISTANT_AVAILABLE and not getattr(get_assistant(), "ready", lambda: True)():
+                st.info(f"⏳ {ASSISTANT_TYPE} (loading in the background)")
+            elif ASSISTANT_AVAILABLE:
                 st.success(f"✅ {ASSISTANT_TYPE}")
             else:
                 st.error("❌ Assistant (demo mode)")
@@ -374,6 +449,12 @@ def main():
     elif st.session_state.view_mode == "Analysis Dashboard":
         st.markdown("### Trial Analysis Dashboard")
         
+        facets = get_dataset_facets()
+        if facets:
+            create_trial_visualizations(facets)
+        else:
+            st.info("Dataset charts appear once the index is built (python -m src.indexer.create_index)")
+        
         # Get all trials from chat history
         all_trials = []
         for message in st.session_state.messages:
@@ -381,11 +462,11 @@ def main():
                 all_trials.extend(message["sources"])
         
         if all_trials:
-            create_trial_visualizations(all_trials)
+            st.subheader("Trials From Your Conversation")
             create_map_visualization(all_trials)
             export_trials(all_trials)
         else:
-            st.info("Start chatting to see trial analysis!")
+            st.info("Start chatting to map and export the trials you find!")
     
     elif st.session_state.view_mode == "Trial Comparison":
         st.markdown("### Trial Comparison Tool")
@@ -421,6 +502,28 @@ def main():
                     st.markdown(format_trial_card(trial2), unsafe_allow_html=True)
         else:
             st.info("Save some trials from chat to compare them here!")
+        
+        # Nearest neighbours from the precomputed similarity index
+        similarity_index = get_similarity_index()
+        if similarity_index is not None:
+            st.markdown("### Most Similar Trials")
+            saved_ids = [t.get('nct_id') for t in st.session_state.saved_trials if t.get('nct_id')]
+            nct_id = st.text_input("NCT Number", value=saved_ids[0] if saved_ids else "").strip()
+            if nct_id:
+                neighbors = similarity_index.most_similar(nct_id, k=5)
+                if not neighbors:
+                    st.info(f"{nct_id} is not in the index")
+                else:
+                    assistant = get_assistant()
+                    collection = getattr(assistant, "collection", None)
+                    metadatas = {}
+                    if collection is not None:
+                        fetched = collection.get(ids=[trial_id for trial_id, _ in neighbors], include=["metadatas"])
+                        metadatas = dict(zip(fetched["ids"], fetched["metadatas"]))
+                    for trial_id, score in neighbors:
+                        trial = metadatas.get(trial_id, {"brief_title": trial_id})
+                        st.metric(trial_id, f"{score:.2%}")
+                        st.markdown(format_trial_card(trial), unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
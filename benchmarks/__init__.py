@@ -0,0 +1,6 @@
+"""Benchmarks for the indexer and the assistant.
+
+- ``synthetic``: deterministic synthetic trials with the demo CSV's columns
+- ``run_suite``: build, load, memory and query latency report (JSON)
+- ``bench_*``: focused micro-benchmarks of single components
+"""
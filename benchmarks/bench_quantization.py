@@ -0,0 +1,85 @@
+"""Compare quantized vector index modes: size, load time, query latency and retrieval quality.
+
+Vectors are synthetic and clustered like sentence embeddings (384
+dimensions). Each query is a perturbed copy of one trial's vector, so
+``hit@10`` (that trial is retrieved) stands in for the evaluation hit rate,
+and ``recall@10`` measures agreement with exact float32 search.
+
+Usage:
+    python -m benchmarks.bench_quantization [n_trials] [n_queries]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.rag.embedding_cache import EmbeddingCache, text_keys
+from src.rag.quantized import QUANTIZATION_MODES, QuantizedIndex, build_quantized_index
+
+DIM = 384
+TOP_K = 10
+
+
+def make_vectors(n: int, dim: int = DIM, clusters: int = 200, seed: int = 42) -> np.ndarray:
+    """Normalized vectors scattered around a few hundred topic centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def directory_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in Path(path).iterdir()) / 1e6
+
+
+def main(n_trials: int = 100_000, n_queries: int = 200):
+    vectors = make_vectors(n_trials)
+    rng = np.random.default_rng(7)
+    targets = rng.choice(n_trials, n_queries, replace=False)
+    queries = vectors[targets] + 0.7 * rng.normal(size=(n_queries, DIM)).astype(np.float32) / np.sqrt(DIM)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :TOP_K]
+    ids = [f"NCT{i:08d}" for i in range(n_trials)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_root = Path(tmp) / "embedding_cache"
+        cache = EmbeddingCache(cache_root, "bench")
+        cache.append(text_keys(ids), vectors)
+        cache.save()
+        rows = cache.lookup(text_keys(ids))
+        print(f"{n_trials} trials, {n_queries} queries; float32 vectors: {vectors.nbytes / 1e6:.1f} MB")
+        print(f"{'mode':>8} {'rescore':>8} {'size MB':>8} {'build s':>8} {'load ms':>8} "
+              f"{'p50 ms':>7} {'p95 ms':>7} {'hit@10':>7} {'recall@10':>9}")
+
+        for mode in QUANTIZATION_MODES:
+            directory = Path(tmp) / mode
+            start = time.perf_counter()
+            build_quantized_index(directory, ids, cache, rows, mode=mode)
+            build_s = time.perf_counter() - start
+
+            for rescore in (False, True):
+                start = time.perf_counter()
+                index = QuantizedIndex.load(directory, cache_root if rescore else None)
+                np.asarray(index.codes).sum()  # page the codes in, as the first query would
+                load_ms = (time.perf_counter() - start) * 1000
+
+                latencies, hits, recall = [], 0, 0.0
+                for q, query in enumerate(queries):
+                    start = time.perf_counter()
+                    found = index.search(query, TOP_K, rescore_k=200)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found_rows = {int(trial_id[3:]) for trial_id, _ in found}
+                    hits += int(targets[q]) in found_rows
+                    recall += len(found_rows & set(exact[q].tolist())) / TOP_K
+
+                print(f"{mode:>8} {str(rescore):>8} {directory_mb(directory):>8.1f} {build_s:>8.1f} "
+                      f"{load_ms:>8.1f} {np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 95):>7.2f} "
+                      f"{hits / n_queries:>7.3f} {recall / n_queries:>9.3f}")
+
+
+if __name__ == "__main__":
+    n_trials = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(n_trials, n_queries)
@@ -0,0 +1,66 @@
+"""Benchmark assistant startup: import time, constructor time and time to first query.
+
+Each run is a fresh interpreter, so imports are cold. The LLM is replaced by
+an echo stub, so the first query measures retrieval (Chroma client, embedding
+model) rather than model latency. ``background=False`` loads everything in
+the constructor, as before lazy startup, for comparison.
+
+Usage:
+    python -m benchmarks.bench_startup [persist_directory] [runs]
+"""
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+class EchoLLM:
+    def __call__(self, prompt, **kwargs):
+        return "ok"
+
+
+def child(persist_directory: str, background: bool):
+    """Time one cold start in this process and print the timings as JSON."""
+    start = time.perf_counter()
+    sys.path.insert(0, str(ROOT_DIR / "src"))
+    from rag.assistant import ClinicalTrialAssistant
+    imported = time.perf_counter()
+    assistant = ClinicalTrialAssistant(persist_directory=persist_directory, llm=EchoLLM(), background=background)
+    constructed = time.perf_counter()
+    assistant.query("Phase 3 breast cancer trials", n_results=3)
+    answered = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "constructor_ms": (constructed - imported) * 1000,
+        "first_query_ms": (answered - constructed) * 1000,
+        "total_ms": (answered - start) * 1000,
+    }))
+
+
+def main(persist_directory: str, runs: int = 3):
+    print(f"{'mode':>11} {'import ms':>10} {'ctor ms':>9} {'1st query ms':>13} {'total ms':>9}")
+    for background in (False, True):
+        timings = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child", persist_directory, str(background)],
+                cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            timings.append(json.loads(output.strip().splitlines()[-1]))
+        median = {key: float(np.median([t[key] for t in timings])) for key in timings[0]}
+        mode = "background" if background else "eager"
+        print(f"{mode:>11} {median['import_ms']:>10.0f} {median['constructor_ms']:>9.0f} "
+              f"{median['first_query_ms']:>13.0f} {median['total_ms']:>9.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3] == "True")
+    else:
+        persist_directory = sys.argv[1] if len(sys.argv) > 1 else str(ROOT_DIR / "data" / "chroma_db")
+        runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+        main(persist_directory, runs)
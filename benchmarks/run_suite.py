@@ -0,0 +1,231 @@
+"""Repeatable end-to-end benchmark suite on synthetic trials, written to a JSON report.
+
+Stages, each in a fresh interpreter so memory numbers do not leak between them:
+
+- ``build``: index build throughput (trials/s) and peak RSS of the indexer
+  and its workers
+- ``load``: reading the trial table (CSV, and the Arrow trial store when
+  pyarrow is installed) and starting the assistant, with RSS after each
+- ``query``: end-to-end query latency (p50/p95/p99) at several
+  ``n_results`` values, plus the assistant's per-stage latency summaries
+
+Embeddings use the offline hashing backend (``EMBEDDING_BACKEND=hash``)
+unless ``--real-embeddings`` is given, and the LLM is an echo stub, so the
+suite runs without network access. Query caches are disabled so every
+query does the full work. Compare two reports with ``--compare``.
+
+Usage:
+    python -m benchmarks.run_suite [--trials 20000] [--skew 1.1] [--seed 0] [--queries 50] [--output report.json]
+    python -m benchmarks.run_suite --compare baseline.json report.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+N_RESULTS = [1, 3, 5, 10]
+QUESTIONS = [
+    "Phase 3 trials of pembrolizumab in breast cancer",
+    "recruiting studies for type 2 diabetes",
+    "exercise programs for heart failure patients",
+    "mRNA vaccine trials for COVID-19",
+    "completed trials of metformin",
+    "cognitive behavioral therapy for depression",
+    "CAR-T cell therapy in lymphoma",
+    "vitamin D supplementation for osteoarthritis",
+    "wearable sensor studies in atrial fibrillation",
+    "prevention trials for stroke",
+]
+
+
+class EchoLLM:
+    def __call__(self, prompt, **kwargs):
+        return "ok"
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB (Linux; 0.0 elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def percentiles(samples_ms) -> dict:
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "mean_ms": float(np.mean(samples_ms))}
+
+
+def stage_build(csv_path: str, persist_directory: str, workers: int) -> dict:
+    from src.indexer.create_index import create_vector_store, iter_clinical_trials, peak_rss_mb
+
+    start = time.perf_counter()
+    collection = create_vector_store(iter_clinical_trials(csv_path), persist_directory, workers=workers or None)
+    seconds = time.perf_counter() - start
+    count = collection.count()
+    return {"trials": count, "seconds": seconds, "trials_per_s": count / seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def stage_load(csv_path: str, persist_directory: str) -> dict:
+    from src.indexer.trial_store import PYARROW_AVAILABLE, convert_csv_to_store, open_trial_table, store_path
+
+    result = {"rss_start_mb": current_rss_mb()}
+    start = time.perf_counter()
+    import pandas as pd
+    df = pd.read_csv(csv_path, dtype=str)
+    result["csv_read_ms"] = (time.perf_counter() - start) * 1000
+    result["rss_after_csv_mb"] = current_rss_mb()
+    del df
+    if PYARROW_AVAILABLE:
+        convert_csv_to_store(csv_path)
+        start = time.perf_counter()
+        table = open_trial_table(store_path(csv_path))
+        result["store_open_ms"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        table.to_pandas()
+        result["store_to_pandas_ms"] = (time.perf_counter() - start) * 1000
+
+    sys.path.insert(0, str(ROOT_DIR / "src"))
+    rss = current_rss_mb()
+    start = time.perf_counter()
+    from rag.assistant import ClinicalTrialAssistant
+    assistant = ClinicalTrialAssistant(persist_directory=persist_directory, llm=EchoLLM(), background=False)
+    assistant.query(QUESTIONS[0], n_results=3)
+    result["assistant_ready_ms"] = (time.perf_counter() - start) * 1000
+    result["assistant_rss_mb"] = current_rss_mb() - rss
+    return result
+
+
+def stage_query(persist_directory: str, queries: int) -> dict:
+    sys.path.insert(0, str(ROOT_DIR / "src"))
+    from rag.assistant import ClinicalTrialAssistant
+
+    assistant = ClinicalTrialAssistant(persist_directory=persist_directory, llm=EchoLLM(), background=False,
+                                       cache_size=0, semantic_cache_threshold=None)
+    assistant.query(QUESTIONS[0], n_results=3)  # warm up
+    assistant.tracer.reset()
+    result = {}
+    for n_results in N_RESULTS:
+        samples = []
+        for i in range(queries):
+            start = time.perf_counter()
+            assistant.query(QUESTIONS[i % len(QUESTIONS)], n_results=n_results)
+            samples.append((time.perf_counter() - start) * 1000)
+        result[f"n_results_{n_results}"] = percentiles(samples)
+    result["stages"] = assistant.latency_stats()
+    return result
+
+
+def run_stage(name: str, *args) -> dict:
+    """Run one stage in a child interpreter and return its JSON result."""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run_suite", "--stage", name, *map(str, args)],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run_suite(trials: int, skew: float, seed: int, queries: int, workers: int) -> dict:
+    from benchmarks.synthetic import write_trials_csv
+
+    with tempfile.TemporaryDirectory(prefix="ct-bench-") as tmp:
+        csv_path = str(Path(tmp) / "trials.csv")
+        persist_directory = str(Path(tmp) / "chroma_db")
+        start = time.perf_counter()
+        write_trials_csv(csv_path, trials, seed=seed, skew=skew)
+        print(f"Generated {trials} trials in {time.perf_counter() - start:.1f}s")
+        report = {
+            "meta": {
+                "trials": trials, "skew": skew, "seed": seed, "queries": queries, "workers": workers,
+                "embedding_backend": os.environ["EMBEDDING_BACKEND"], "git_commit": git_commit(),
+                "python": platform.python_version(), "platform": platform.platform(),
+                "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+        }
+        print("Building index...")
+        report["build"] = run_stage("build", csv_path, persist_directory, workers)
+        print("Measuring load time and memory...")
+        report["load"] = run_stage("load", csv_path, persist_directory)
+        print("Measuring query latency...")
+        report["query"] = run_stage("query", persist_directory, queries)
+    return report
+
+
+def _numeric_leaves(report: dict, prefix: str = ""):
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _numeric_leaves(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compare(baseline_path: str, report_path: str):
+    """Print every numeric metric of two reports side by side."""
+    with open(baseline_path) as f:
+        baseline = dict(_numeric_leaves(json.load(f)))
+    with open(report_path) as f:
+        report = dict(_numeric_leaves(json.load(f)))
+    print(f"{'metric':<44} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for path, value in report.items():
+        if path.startswith("meta.") or path not in baseline:
+            continue
+        old = baseline[path]
+        ratio = f"{value / old:>7.2f}" if old else f"{'-':>7}"
+        print(f"{path:<44} {old:>12.1f} {value:>12.1f} {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=20000)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=50, help="queries per n_results value")
+    parser.add_argument("--workers", type=int, default=0, help="indexer worker processes (0: one per CPU)")
+    parser.add_argument("--real-embeddings", action="store_true", help="use the configured embedding model")
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "REPORT"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.real_embeddings:
+        os.environ["EMBEDDING_BACKEND"] = "hash"  # inherited by the stage processes
+    os.environ.setdefault("EMBEDDING_BACKEND", "default")
+    report = run_suite(args.trials, args.skew, args.seed, args.queries, args.workers)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--stage":
+        stage, args = sys.argv[2], sys.argv[3:]
+        if stage == "build":
+            result = stage_build(args[0], args[1], int(args[2]))
+        elif stage == "load":
+            result = stage_load(args[0], args[1])
+        else:
+            result = stage_query(args[0], int(args[1]))
+        print(json.dumps(result))
+    else:
+        main()
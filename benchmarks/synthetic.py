@@ -0,0 +1,134 @@
+"""Deterministic synthetic clinical trials with the columns of data/clin_trials_demo.csv.
+
+Conditions and interventions follow a Zipf-like distribution (``skew`` is
+the exponent; 0 is uniform), so a few conditions dominate as in the real
+registry. Statuses, phases and purposes use registry-like proportions, and
+titles are built from templates. The same ``seed`` always yields the same
+trials, chunk by chunk, so millions of rows can be written without holding
+them in memory.
+
+Usage:
+    python -m benchmarks.synthetic data/clin_trials_synthetic.csv 100000 [--skew 1.1] [--seed 0]
+"""
+from pathlib import Path
+from typing import Iterator, Union
+import argparse
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["NCT Number", "Brief Title", "Official Title", "Overall Status", "Phases", "Start Date",
+           "Primary Purpose", "Conditions", "Interventions"]
+
+CONDITIONS = [
+    "Breast Cancer", "Type 2 Diabetes", "Hypertension", "COVID-19", "Asthma", "Heart Failure",
+    "Prostate Cancer", "Depression", "Obesity", "Alzheimer Disease", "Lung Cancer", "HIV Infections",
+    "Rheumatoid Arthritis", "Multiple Sclerosis", "Chronic Kidney Disease", "Parkinson Disease",
+    "Melanoma", "Colorectal Cancer", "Schizophrenia", "Psoriasis", "Atrial Fibrillation", "Migraine",
+    "Hepatitis C", "Stroke", "Osteoarthritis", "Chronic Obstructive Pulmonary Disease", "Leukemia",
+    "Lymphoma", "Crohn Disease", "Ulcerative Colitis", "Sickle Cell Disease", "Cystic Fibrosis",
+    "Epilepsy", "Insomnia", "Anxiety Disorders", "Pancreatic Cancer", "Ovarian Cancer", "Glioblastoma",
+    "Malaria", "Tuberculosis",
+]
+INTERVENTIONS = [
+    "Drug: Pembrolizumab", "Drug: Metformin", "Drug: Placebo", "Behavioral: Exercise Program",
+    "Drug: Semaglutide", "Biological: mRNA Vaccine", "Drug: Nivolumab", "Device: Continuous Glucose Monitor",
+    "Behavioral: Cognitive Behavioral Therapy", "Drug: Atorvastatin", "Procedure: Surgery",
+    "Radiation: Stereotactic Radiotherapy", "Drug: Adalimumab", "Dietary Supplement: Vitamin D",
+    "Drug: Lisinopril", "Biological: CAR-T Cells", "Drug: Dapagliflozin", "Device: Wearable Sensor",
+    "Drug: Sertraline", "Drug: Remdesivir", "Other: Standard of Care", "Drug: Tocilizumab",
+    "Behavioral: Mindfulness Training", "Drug: Insulin Glargine",
+]
+STATUSES = (["Completed", "Recruiting", "Unknown status", "Terminated", "Not yet recruiting",
+             "Active, not recruiting", "Withdrawn", "Enrolling by invitation"],
+            [0.45, 0.18, 0.13, 0.07, 0.06, 0.06, 0.03, 0.02])
+PHASES = (["", "Phase 1", "Phase 2", "Phase 3", "Phase 4", "Phase 1|Phase 2", "Phase 2|Phase 3", "Early Phase 1"],
+          [0.30, 0.14, 0.20, 0.13, 0.12, 0.05, 0.03, 0.03])
+PURPOSES = (["Treatment", "Prevention", "Supportive Care", "Diagnostic", "Basic Science", "Health Services Research",
+             "Screening", "Other"],
+            [0.62, 0.11, 0.07, 0.06, 0.06, 0.03, 0.02, 0.03])
+TITLE_TEMPLATES = [
+    "Study of {intervention} in Patients With {condition}",
+    "{intervention} for {condition}",
+    "Safety and Efficacy of {intervention} in {condition}",
+    "A Trial of {intervention} Versus Placebo in Adults With {condition}",
+    "{condition} Prevention With {intervention}",
+    "Long-Term Follow-Up of {intervention} in {condition}",
+]
+OFFICIAL_TEMPLATES = [
+    "A Randomized, Double-Blind, Placebo-Controlled {phase} Study to Evaluate {intervention} in Participants With {condition}",
+    "An Open-Label, Multicenter {phase} Trial of {intervention} in {condition}",
+    "A Prospective Cohort Study of {intervention} Outcomes in {condition} (Protocol {number})",
+]
+
+
+def zipf_weights(n: int, skew: float) -> np.ndarray:
+    """Probabilities proportional to 1 / rank ** skew."""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_trials(n_trials: int, seed: int = 0, skew: float = 1.1, start: int = 0) -> pd.DataFrame:
+    """``n_trials`` synthetic trials numbered from ``start``; same arguments, same rows."""
+    rng = np.random.default_rng([seed, start])
+    names = np.array(CONDITIONS, dtype=object)
+    conditions = names[rng.choice(len(names), n_trials, p=zipf_weights(len(names), skew))]
+    # A quarter of trials study two conditions
+    second = names[rng.choice(len(names), n_trials)]
+    two = rng.random(n_trials) < 0.25
+    condition_lists = np.where(two & (second != conditions), conditions + "|" + second, conditions)
+    interventions = np.array(INTERVENTIONS)[
+        rng.choice(len(INTERVENTIONS), n_trials, p=zipf_weights(len(INTERVENTIONS), skew))]
+    phases = rng.choice(PHASES[0], n_trials, p=PHASES[1])
+    titles = rng.integers(0, len(TITLE_TEMPLATES), n_trials)
+    officials = rng.integers(0, len(OFFICIAL_TEMPLATES), n_trials)
+    start_days = rng.integers(0, 365 * 25, n_trials)
+    start_dates = (np.datetime64("2000-01-01") + start_days.astype("timedelta64[D]")).astype(str)
+    missing_dates = rng.random(n_trials) < 0.02
+
+    brief_titles = []
+    official_titles = []
+    for i in range(n_trials):
+        name = interventions[i].split(": ", 1)[-1]
+        brief_titles.append(TITLE_TEMPLATES[titles[i]].format(intervention=name, condition=conditions[i]))
+        official_titles.append(OFFICIAL_TEMPLATES[officials[i]].format(
+            phase=phases[i].replace("|", "/") or "Observational", intervention=name, condition=conditions[i],
+            number=start + i))
+
+    return pd.DataFrame({
+        "NCT Number": [f"NCT{start + i + 1:08d}" for i in range(n_trials)],
+        "Brief Title": brief_titles,
+        "Official Title": official_titles,
+        "Overall Status": rng.choice(STATUSES[0], n_trials, p=STATUSES[1]),
+        "Phases": phases,
+        "Start Date": np.where(missing_dates, "", start_dates),
+        "Primary Purpose": rng.choice(PURPOSES[0], n_trials, p=PURPOSES[1]),
+        "Conditions": condition_lists,
+        "Interventions": interventions,
+    }, columns=COLUMNS)
+
+
+def iter_trials(n_trials: int, seed: int = 0, skew: float = 1.1, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Yield the trials in chunks of ``chunk_size``; the same arguments always yield the same rows."""
+    for start in range(0, n_trials, chunk_size):
+        yield generate_trials(min(chunk_size, n_trials - start), seed, skew, start)
+
+
+def write_trials_csv(path: Union[str, Path], n_trials: int, seed: int = 0, skew: float = 1.1,
+                     chunk_size: int = 50_000) -> Path:
+    """Write ``n_trials`` synthetic trials to a CSV file, one chunk at a time."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for i, chunk in enumerate(iter_trials(n_trials, seed, skew, chunk_size)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("n_trials", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew", type=float, default=1.1)
+    args = parser.parse_args()
+    write_trials_csv(args.path, args.n_trials, args.seed, args.skew)
+    print(f"Wrote {args.n_trials} synthetic trials to {args.path}")
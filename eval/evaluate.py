@@ -1,56 +1,181 @@
-"""Evaluation script for measuring retrieval accuracy."""
-import json
+"""Evaluation of retrieval quality and latency, for comparing retrieval configurations.
+
+Every test case in ``test_cases.json`` (``question`` plus the NCT numbers of
+its ``relevant_trials``) is retrieved once per configuration through
+``ClinicalTrialAssistant.retrieve``, with ``--workers`` queries in flight.
+For each k in ``--k`` the report gives hit rate, recall, MRR and nDCG
+(binary relevance), computed on the top k of one ranked list per question;
+per-query latency is summarised as p50/p95/p99.
+
+``--baseline`` compares with a saved report and exits non-zero when a
+quality metric drops by more than ``--tolerance``, so a performance change
+to retrieval can be accepted or rejected on the numbers.
+
+Usage:
+    python -m eval.evaluate [--configs default,vector_only] [--k 1,3,5,10] [--output report.json]
+    python -m eval.evaluate --baseline report.json
+"""
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import pandas as pd
-from src.rag.assistant import TrialAssistant
+from typing import Dict, List, Sequence
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.rag.assistant import ClinicalTrialAssistant
+
+# Named retrieval configurations (ClinicalTrialAssistant keyword arguments)
+CONFIGS = {
+    "default": {},
+    "vector_only": {"hybrid": False, "reranker": None, "collapse_duplicates": False},
+    "no_rerank": {"reranker": None},
+    "no_auto_filters": {"auto_filters": False},
+    "quantized": {"vector_index": "quantized"},
+}
+QUALITY_METRICS = ("hit_rate", "recall", "mrr", "ndcg")
 
-def load_test_cases():
+
+class NoLLM:
+    """Placeholder LLM; retrieval never calls it."""
+
+    def __call__(self, prompt, **kwargs):
+        raise RuntimeError("The evaluation does not generate answers")
+
+
+def load_test_cases(path: Path = Path(__file__).parent / "test_cases.json") -> List[Dict]:
     """Load test cases from JSON file."""
-    with open(Path(__file__).parent / "test_cases.json") as f:
-        return json.load(f)
-
-def evaluate_retrieval(assistant, test_cases, k=5):
-    """Evaluate retrieval accuracy on test cases."""
-    results = {
-        f"hit_rate@{k}": 0,
-        f"precision@{k}": 0,
+    with open(path) as f:
+        data = json.load(f)
+    return data["test_cases"] if isinstance(data, dict) else data
+
+
+def score_ranking(retrieved: Sequence[str], relevant: Sequence[str], k: int) -> Dict[str, float]:
+    """Hit, recall, reciprocal rank and nDCG of the top ``k`` retrieved ids."""
+    relevant = set(relevant)
+    top = list(retrieved)[:k]
+    gains = [1.0 if trial_id in relevant else 0.0 for trial_id in top]
+    first = next((rank for rank, gain in enumerate(gains, 1) if gain), None)
+    dcg = sum(gain / np.log2(rank + 1) for rank, gain in enumerate(gains, 1))
+    ideal = sum(1 / np.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return {
+        "hit_rate": 1.0 if first else 0.0,
+        "recall": sum(gains) / len(relevant) if relevant else 0.0,
+        "mrr": 1.0 / first if first else 0.0,
+        "ndcg": dcg / ideal if ideal else 0.0,
     }
-    
-    total = len(test_cases)
-    hits = 0
-    precision_sum = 0
-    
-    for case in test_cases:
-        query = case["question"]
-        expected_trials = set(case["relevant_trials"])
-        
-        retrieved_trials = assistant.retrieve_relevant_trials(query, k=k)
-        retrieved_ids = set(trial.id for trial in retrieved_trials)
-        
-        # Calculate hits
-        if len(expected_trials.intersection(retrieved_ids)) > 0:
-            hits += 1
-            
-        # Calculate precision
-        precision = len(expected_trials.intersection(retrieved_ids)) / k
-        precision_sum += precision
-    
-    results[f"hit_rate@{k}"] = hits / total
-    results[f"precision@{k}"] = precision_sum / total
-    
-    return results
+
+
+def evaluate_retrieval(assistant, test_cases: List[Dict], ks: Sequence[int] = (1, 3, 5, 10),
+                       workers: int = 4) -> Dict:
+    """Retrieve every test case concurrently and aggregate quality and latency."""
+    max_k = max(ks)
+    assistant.retrieve([test_cases[0]["question"]], n_results=max_k)  # warm up
+    # The warm-up loaded the side indexes, so this is the backend that actually runs
+    backend = "quantized" if getattr(assistant, "quantized", None) is not None else "chroma"
+    if getattr(assistant, "vector_index", "chroma") != backend:
+        raise RuntimeError(f"vector_index={assistant.vector_index!r} but no index was found at "
+                           f"{assistant.quantized_path}; build it with INDEX_QUANTIZATION=float16|int8|pq")
+
+    def run(case):
+        start = time.perf_counter()
+        hits = assistant.retrieve([case["question"]], n_results=max_k, filters=case.get("filters"))[0]
+        return hits["ids"], (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(run, test_cases))
+    wall_s = time.perf_counter() - start
+
+    latencies = [ms for _, ms in outcomes]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    report = {
+        "vector_index": backend,
+        "cases": len(test_cases),
+        "latency": {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                    "mean_ms": float(np.mean(latencies)), "queries_per_s": len(test_cases) / wall_s},
+        "per_case": [],
+    }
+    for k in ks:
+        scores = [score_ranking(ids, case["relevant_trials"], k) for case, (ids, _) in zip(test_cases, outcomes)]
+        for metric in QUALITY_METRICS:
+            report[f"{metric}@{k}"] = float(np.mean([s[metric] for s in scores]))
+    for case, (ids, ms) in zip(test_cases, outcomes):
+        report["per_case"].append({"question": case["question"], "retrieved": ids[:max_k],
+                                   "relevant": case["relevant_trials"], "latency_ms": ms})
+    return report
+
+
+def print_comparison(reports: Dict[str, Dict], ks: Sequence[int]):
+    """Print metrics of all configurations side by side."""
+    names = list(reports)
+    rows = [f"{metric}@{k}" for k in ks for metric in QUALITY_METRICS]
+    print(f"{'metric':<16}" + "".join(f"{name:>16}" for name in names))
+    print(f"{'vector_index':<16}" + "".join(f"{reports[name]['vector_index']:>16}" for name in names))
+    for row in rows:
+        print(f"{row:<16}" + "".join(f"{reports[name][row]:>16.3f}" for name in names))
+    for row in ("p50_ms", "p95_ms", "p99_ms", "queries_per_s"):
+        print(f"{row:<16}" + "".join(f"{reports[name]['latency'][row]:>16.1f}" for name in names))
+
+
+def regressions(reports: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Quality metrics that dropped by more than ``tolerance`` against the baseline report."""
+    found = []
+    for name, report in reports.items():
+        for metric, value in report.items():
+            if metric.split("@")[0] not in QUALITY_METRICS or metric not in baseline.get(name, {}):
+                continue
+            old = baseline[name][metric]
+            if value < old - tolerance:
+                found.append(f"{name} {metric}: {old:.3f} -> {value:.3f}")
+    return found
+
 
 def main():
     """Run evaluation and print results."""
-    assistant = TrialAssistant()
-    test_cases = load_test_cases()
-    
-    print("Running evaluation...")
-    results = evaluate_retrieval(assistant, test_cases)
-    
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", default="default,vector_only",
+                        help=f"comma-separated, from: {', '.join(CONFIGS)}")
+    parser.add_argument("--k", default="1,3,5,10", help="comma-separated cutoffs")
+    parser.add_argument("--workers", type=int, default=4, help="queries in flight")
+    parser.add_argument("--test-cases", type=Path, default=Path(__file__).parent / "test_cases.json")
+    parser.add_argument("--persist-directory", default=None)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="report to check for quality regressions")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    ks = sorted(int(k) for k in args.k.split(","))
+    test_cases = load_test_cases(args.test_cases)
+    reports = {}
+    for name in args.configs.split(","):
+        if name not in CONFIGS:
+            parser.error(f"Unknown configuration: {name}")
+        print(f"Evaluating {name} on {len(test_cases)} test cases...")
+        assistant = ClinicalTrialAssistant(persist_directory=args.persist_directory, llm=NoLLM(),
+                                           background=False, **CONFIGS[name])
+        try:
+            reports[name] = evaluate_retrieval(assistant, test_cases, ks, args.workers)
+        except RuntimeError as e:
+            sys.exit(f"Cannot evaluate {name}: {e}")
+
     print("\nResults:")
-    for metric, value in results.items():
-        print(f"{metric}: {value:.2f}")
+    print_comparison(reports, ks)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(reports, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print("No quality regressions against the baseline")
+
 
 if __name__ == "__main__":
     main()
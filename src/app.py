@@ -1,12 +1,6 @@
 import streamlit as st
-import pandas as pd
-import folium
-from streamlit_folium import folium_static
-import plotly.express as px
 from datetime import datetime, timedelta
 from pathlib import Path
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 import json
 import sys
 import os
@@ -14,7 +8,10 @@ import os
 # Add parent directory to Python path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from rag.assistant import ClinicalTrialAssistant
+from rag.facets import facets_path, load_facets
+from rag.pool import get_shared_assistant
+from indexer.trial_explorer import TrialExplorer
+from ui.streaming import write_answer_stream
 
 # Page configuration
 st.set_page_config(
@@ -25,24 +22,40 @@ st.set_page_config(
 )
 
 def initialize_assistant():
-    """Initialize the clinical trial assistant with error handling."""
+    """Get the process-wide shared assistant (one per server, not per session)."""
     try:
-        assistant = ClinicalTrialAssistant()
+        assistant = get_shared_assistant()
         return assistant, None
     except Exception as e:
         return None, str(e)
 
-def load_demo_data():
-    """Load and display demo data statistics."""
+@st.cache_resource
+def load_trial_explorer(csv_path, version):
+    return TrialExplorer.for_csv(csv_path)
+
+def get_trial_explorer():
+    """Open the demo data's explorer database, building it on first use or after the CSV changes."""
     try:
         data_path = Path(__file__).parent.parent / "data" / "clin_trials_demo.csv"
         if data_path.exists():
-            df = pd.read_csv(data_path)
-            return df
+            return load_trial_explorer(str(data_path), data_path.stat().st_mtime_ns)
     except Exception as e:
         st.error(f"Error loading demo data: {e}")
     return None
 
+@st.cache_resource
+def load_dataset_facets(path, version):
+    return load_facets(path)
+
+def get_dataset_facets():
+    """Facet counts of the whole index, reread after the indexer rewrites them."""
+    path = facets_path(Path(__file__).parent.parent / "data" / "chroma_db")
+    try:
+        version = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    return load_dataset_facets(str(path), version)
+
 def main():
     st.title("🏥 Clinical Trial Assistant")
     st.markdown("Ask questions about clinical trials and get AI-powered answers from our database.")
@@ -59,22 +72,35 @@ def main():
         - "What heart disease prevention trials are available?"
         """)
         
-        # Display demo data info
-        df = load_demo_data()
-        if df is not None:
+        # Dataset statistics, precomputed by the indexer
+        facets = get_dataset_facets()
+        if facets is not None:
+            total = facets["total"]
+            status_counts = facets["counts"]["status"]
+            phase_counts = facets["counts"]["phase"]
+        else:
+            # Index built before facet counts existed: count the demo data instead
+            explorer = get_trial_explorer()
+            total = explorer.count() if explorer is not None else None
+            status_counts = explorer.value_counts('Overall Status') \
+                if explorer is not None and 'Overall Status' in explorer.columns else {}
+            phase_counts = explorer.value_counts('Phases') \
+                if explorer is not None and 'Phases' in explorer.columns else {}
+        if total is not None:
             st.header("Dataset Info")
-            st.metric("Total Trials", len(df))
+            st.metric("Total Trials", total)
+            if facets is None:
+                st.caption("Counts from the demo data; rebuild the index "
+                           "(python -m src.indexer.create_index) for statistics of the indexed trials.")
             
             # Status distribution
-            if 'Overall Status' in df.columns:
-                status_counts = df['Overall Status'].value_counts()
+            if status_counts:
                 st.subheader("Status Distribution")
                 for status, count in status_counts.items():
                     st.text(f"{status}: {count}")
             
             # Phase distribution
-            if 'Phases' in df.columns:
-                phase_counts = df['Phases'].value_counts()
+            if phase_counts:
                 st.subheader("Phase Distribution")
                 for phase, count in phase_counts.items():
                     st.text(f"{phase}: {count}")
@@ -120,36 +146,39 @@ def main():
         
         # Generate assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Searching trials and generating response..."):
-                try:
-                    response = st.session_state.assistant.query(prompt, n_results=3)
-                    answer = response.get("answer", "I apologize, but I couldn't generate a response.")
-                    sources = response.get("sources", [])
-                    
+            try:
+                with st.spinner("Searching trials..."):
+                    response = st.session_state.assistant.query_stream(prompt, n_results=3)
+                sources = response.get("sources", [])
+                
+                # Render tokens as they arrive
+                answer = write_answer_stream(response["answer_stream"])
+                if not answer:
+                    answer = "I apologize, but I couldn't generate a response."
                     st.markdown(answer)
-                    
-                    # Add assistant message to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": answer,
-                        "sources": sources
-                    })
-                    
-                    # Display sources
-                    if sources:
-                        with st.expander("View Sources"):
-                            for i, source in enumerate(sources, 1):
-                                st.markdown(f"**{i}. {source.get('brief_title', 'Untitled')}**")
-                                st.markdown(f"- Status: {source.get('status', 'Unknown')}")
-                                st.markdown(f"- Phase: {source.get('phase', 'Unknown')}")
-                                st.markdown(f"- NCT ID: {source.get('nct_id', 'Unknown')}")
-                                if i < len(sources):
-                                    st.markdown("---")
-                    
-                except Exception as e:
-                    error_msg = f"Error generating response: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                
+                # Add assistant message to chat history
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": answer,
+                    "sources": sources
+                })
+                
+                # Display sources
+                if sources:
+                    with st.expander("View Sources"):
+                        for i, source in enumerate(sources, 1):
+                            st.markdown(f"**{i}. {source.get('brief_title', 'Untitled')}**")
+                            st.markdown(f"- Status: {source.get('status', 'Unknown')}")
+                            st.markdown(f"- Phase: {source.get('phase', 'Unknown')}")
+                            st.markdown(f"- NCT ID: {source.get('nct_id', 'Unknown')}")
+                            if i < len(sources):
+                                st.markdown("---")
+                
+            except Exception as e:
+                error_msg = f"Error generating response: {str(e)}"
+                st.error(error_msg)
+                st.session_state.messages.append({"role": "assistant", "content": error_msg})
     
     # Clear chat button
     col1, col2 = st.columns([1, 4])
@@ -161,54 +190,71 @@ def main():
     # Additional features
     st.header("Trial Explorer")
     
-    # Display demo data table
-    df = load_demo_data()
-    if df is not None:
+    # Display demo data table, one page at a time
+    explorer = get_trial_explorer()
+    if explorer is not None:
         st.subheader("Available Clinical Trials")
         
+        search = st.text_input("Search trials", placeholder="Title, condition, intervention or NCT number")
+        
         # Filters
+        filters = {}
         col1, col2 = st.columns(2)
         with col1:
-            if 'Overall Status' in df.columns:
+            if 'Overall Status' in explorer.columns:
                 status_filter = st.selectbox(
                     "Filter by Status",
-                    ["All"] + list(df['Overall Status'].unique())
+                    ["All"] + list(explorer.value_counts('Overall Status'))
                 )
+                if status_filter != "All":
+                    filters['Overall Status'] = status_filter
         
         with col2:
-            if 'Phases' in df.columns:
+            if 'Phases' in explorer.columns:
                 phase_filter = st.selectbox(
                     "Filter by Phase", 
-                    ["All"] + list(df['Phases'].unique())
+                    ["All"] + list(explorer.value_counts('Phases'))
                 )
+                if phase_filter != "All":
+                    filters['Phases'] = phase_filter
+        
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            sort_by = st.selectbox("Sort by", ["File order"] + explorer.columns)
+        with col2:
+            descending = st.checkbox("Descending")
+        with col3:
+            page_size = st.selectbox("Rows per page", [25, 50, 100])
         
-        # Apply filters
-        filtered_df = df.copy()
-        if status_filter != "All" and 'Overall Status' in df.columns:
-            filtered_df = filtered_df[filtered_df['Overall Status'] == status_filter]
-        if phase_filter != "All" and 'Phases' in df.columns:
-            filtered_df = filtered_df[filtered_df['Phases'] == phase_filter]
+        # Count matches first so the page number can be bounded
+        total = explorer.count(search, filters)
+        n_pages = max(1, (total + page_size - 1) // page_size)
+        page_number = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
+        page = explorer.page(search, filters, sort_by=None if sort_by == "File order" else sort_by,
+                             descending=descending, offset=(page_number - 1) * page_size, limit=page_size)
         
-        # Display filtered data
-        st.dataframe(filtered_df, use_container_width=True)
+        # Only the visible page is sent to the browser
+        st.dataframe(page["rows"], use_container_width=True)
+        if total:
+            st.caption(f"Showing {page['offset'] + 1}-{page['offset'] + len(page['rows'])} of {total} trials")
         
         # Simple analytics
-        if len(filtered_df) > 0:
+        if total > 0:
             st.subheader("Quick Analytics")
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("Filtered Trials", len(filtered_df))
+                st.metric("Filtered Trials", total)
             
             with col2:
-                if 'Overall Status' in filtered_df.columns:
-                    recruiting_count = len(filtered_df[filtered_df['Overall Status'] == 'Recruiting'])
-                    st.metric("Recruiting", recruiting_count)
+                if 'Overall Status' in explorer.columns:
+                    status_counts = explorer.value_counts('Overall Status', search, filters)
+                    st.metric("Recruiting", status_counts.get('Recruiting', 0))
             
             with col3:
-                if 'Phases' in filtered_df.columns:
-                    phase2_count = len(filtered_df[filtered_df['Phases'].str.contains('Phase 2', na=False)])
-                    st.metric("Phase 2", phase2_count)
+                if 'Phases' in explorer.columns:
+                    phase_counts = explorer.value_counts('Phases', search, filters)
+                    st.metric("Phase 2", sum(n for phase, n in phase_counts.items() if 'Phase 2' in phase))
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,12 @@
 import pandas as pd
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.indexer.trial_store import read_trials
+
 # Load environment variables
 load_dotenv()
 
@@ -12,7 +16,7 @@ def create_demo_dataset(input_file: str, output_file: str, sample_size: int = 50
     Ensures a good distribution of different trial types and phases.
     """
     print(f"Reading full dataset from {input_file}")
-    df = pd.read_csv(input_file)
+    df = read_trials(input_file)
     
     # Stratified sampling to maintain distribution of trial phases and conditions
     demo_df = df.copy()
@@ -1,17 +1,106 @@
+import os
+import shutil
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+import numpy as np
 import pandas as pd
 from chromadb import Client, Settings
-from tqdm import tqdm
 from pathlib import Path
 
 # Get the project root directory
 ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+from src.indexer.dedup import find_duplicate_groups
+from src.indexer.documents import is_index_column, normalize_columns
+from src.indexer.pipeline import DEFAULT_BATCH_SIZE, EMBEDDING_MODEL, iter_batches, run_pipeline
+from src.indexer.trial_store import has_fresh_store, iter_store_batches, read_trials
+from src.rag.bm25 import BM25Builder, bm25_path
+from src.rag.embedding_cache import EmbeddingCache, embedding_cache_path, text_keys
+from src.rag.facets import FacetBuilder, facets_path
+from src.rag.manifest import load_manifest, save_manifest
+from src.rag.quantized import build_quantized_index, quantized_path
+from src.rag.similarity import SimilarityBuilder, similarity_path
+
+# Every indexed column is text; reading them as strings skips type inference
+CSV_DTYPES = str
 
 def load_clinical_trials(csv_path: str) -> pd.DataFrame:
-    """Load clinical trials data from CSV file."""
-    return pd.read_csv(csv_path)
+    """Load clinical trials data from the Arrow trial store, or the CSV file."""
+    df = read_trials(csv_path, columns=is_index_column, dtype=CSV_DTYPES)
+    return normalize_columns(df)
+
+def iter_clinical_trials(csv_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream clinical trials from CSV in batches of ``batch_size`` rows.
+
+    Only the indexed columns are parsed, so memory stays flat regardless of
+    file size. The row index continues across batches. A fresh Arrow trial
+    store next to the CSV is read memory-mapped instead of parsing the CSV.
+    """
+    if has_fresh_store(csv_path):
+        for batch in iter_store_batches(csv_path, columns=is_index_column, batch_size=batch_size):
+            yield normalize_columns(batch)
+        return
+    
+    reader = pd.read_csv(csv_path, usecols=is_index_column, dtype=CSV_DTYPES, chunksize=batch_size)
+    with reader:
+        for chunk in reader:
+            yield normalize_columns(chunk)
+
+def peak_rss_mb() -> Optional[dict]:
+    """Peak resident set size of this process and its finished workers, in MB."""
+    try:
+        import resource
+    except ImportError:
+        return None  # not available on Windows
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "workers": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+def create_vector_store(
+    trials: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    persist_directory: str,
+    incremental: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: Optional[int] = None,
+    dup_groups: Optional[Dict[str, str]] = None,
+    use_embedding_cache: bool = True,
+    quantization: Optional[str] = None,
+):
+    """
+    Create and persist a vector store from clinical trials data.
+
+    With ``incremental=True`` the existing collection is kept online and only
+    trials whose content hash differs from the manifest are upserted; trials
+    no longer present in ``trials`` are deleted.
 
-def create_vector_store(df: pd.DataFrame, persist_directory: str):
-    """Create and persist a vector store from clinical trials data."""
+    ``trials`` is either a DataFrame or an iterable of DataFrame batches such
+    as ``iter_clinical_trials``, which is consumed once without being held
+    in memory.
+
+    Documents are built and embedded by ``workers`` processes (default: one
+    per CPU) while a single writer thread streams them into Chroma. A BM25
+    keyword index, the trial-similarity index used by the Trial
+    Comparison view and the facet counts behind the dashboards are rebuilt
+    over all trials in the same pass.
+
+    ``dup_groups`` (from ``dedup.find_duplicate_groups``) tags near-duplicate
+    trials with a shared ``dup_group`` so queries can collapse them.
+
+    With ``use_embedding_cache``, vectors of previously embedded document
+    texts are reused from the on-disk embedding cache next to the store,
+    which survives full rebuilds.
+
+    ``quantization`` (``"float16"``, ``"int8"`` or ``"pq"``) also writes a
+    quantized copy of all trial vectors for low-memory serving (see
+    ``rag.quantized``). It reads vectors from the embedding cache, which
+    queries also use for rescoring, so it requires ``use_embedding_cache``.
+    """
+    if quantization and not use_embedding_cache:
+        raise ValueError("Quantized vectors are built from the embedding cache; enable use_embedding_cache")
     print(f"Initializing ChromaDB with persist_directory: {persist_directory}")
     client = Client(Settings(
         persist_directory=persist_directory,
@@ -22,61 +111,114 @@ def create_vector_store(df: pd.DataFrame, persist_directory: str):
     existing_collections = client.list_collections()
     print(f"Found collections: {[c.name for c in existing_collections]}")
     
-    # Delete collection if it exists
-    try:
-        client.delete_collection("clinical_trials")
-        print("Deleted existing clinical_trials collection")
-    except:
-        print("No existing collection to delete")
-        
-    print("Creating new clinical_trials collection...")
-    collection = client.create_collection(
-        name="clinical_trials",
-        metadata={"description": "Clinical trials database"}
-    )
-    print("Collection created successfully")
-    
-    # Process in batches of 500 for better performance
-    BATCH_SIZE = 500
-    total_batches = (len(df) + BATCH_SIZE - 1) // BATCH_SIZE
-    
-    for batch_idx in tqdm(range(total_batches), desc="Processing batches"):
-        start_idx = batch_idx * BATCH_SIZE
-        end_idx = min((batch_idx + 1) * BATCH_SIZE, len(df))
-        batch = df.iloc[start_idx:end_idx]
-        
-        documents = []
-        ids = []
-        metadatas = []
-        
-        for idx, row in batch.iterrows():
-            # Create document text combining brief and full title with conditions
-            doc_text = f"Brief Title: {row['Brief Title']}\n\n"
-            doc_text += f"Full Title: {row['Full Title']}\n\n"
-            doc_text += f"Conditions: {row['Conditions']}\n\n"
-            if pd.notna(row['Intervention Description']):
-                doc_text += f"Intervention: {row['Intervention Description']}"
+    manifest = load_manifest(persist_directory)
+    if incremental:
+        collection = client.get_or_create_collection(
+            name="clinical_trials",
+            metadata={"description": "Clinical trials database"}
+        )
+        known_hashes = manifest["trials"]
+        print(f"Incremental update against {len(known_hashes)} indexed trials")
+    else:
+        # Delete collection if it exists
+        try:
+            client.delete_collection("clinical_trials")
+            print("Deleted existing clinical_trials collection")
+        except:
+            print("No existing collection to delete")
             
-            documents.append(doc_text)
-            ids.append(str(idx))
-            metadatas.append({
-                "brief_title": str(row["Brief Title"]),
-                "status": str(row["Overall Status"]),
-                "phase": str(row["Phases"]),
-                "condition": str(row["Conditions"]),
-                "purpose": str(row["Primary Purpose"]),
-                "start_date": str(row["Start Date"])
-            })
-        
-        # Add batch to collection
-        collection.add(
-            documents=documents,
-            ids=ids,
-            metadatas=metadatas
+        print("Creating new clinical_trials collection...")
+        collection = client.create_collection(
+            name="clinical_trials",
+            metadata={"description": "Clinical trials database"}
         )
+        print("Collection created successfully")
+        known_hashes = {}
+    
+    written = 0
+    write = collection.upsert if incremental else collection.add
+    
+    def counted_write(**batch):
+        nonlocal written
+        write(**batch)
+        written += len(batch["ids"])
+    
+    if isinstance(trials, pd.DataFrame):
+        total = (len(trials) + batch_size - 1) // batch_size
+        trials = iter_batches(normalize_columns(trials), batch_size)
+    else:
+        total = None
+    
+    embedding_cache = EmbeddingCache(embedding_cache_path(persist_directory), EMBEDDING_MODEL) \
+        if use_embedding_cache else None
+    bm25 = BM25Builder()
+    similarity = SimilarityBuilder()
+    facets = FacetBuilder()
+    quantize_ids: List[str] = []
+    quantize_keys: List[np.ndarray] = []
     
+    def collect_keys(ids, documents, metadatas):
+        quantize_ids.extend(ids)
+        quantize_keys.append(text_keys(documents))
+    
+    current_hashes = run_pipeline(
+        trials,
+        counted_write,
+        known_hashes=known_hashes if incremental else None,
+        workers=workers,
+        total=total,
+        batch_callbacks=[bm25.add, similarity.add, facets.add] + ([collect_keys] if quantization else []),
+        dup_groups=dup_groups,
+        embedding_cache=embedding_cache
+    )
+    
+    removed = [trial_id for trial_id in known_hashes if trial_id not in current_hashes]
+    for start_idx in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[start_idx:start_idx + batch_size])
+    print(f"Wrote {written} trials, deleted {len(removed)} trials")
+    if embedding_cache is not None:
+        print(f"Reused {embedding_cache.hits} cached embeddings")
+        embedding_cache.save()
+    
+    bm25.save(bm25_path(persist_directory))
+    similarity.save(similarity_path(persist_directory))
+    facets.save(facets_path(persist_directory))
+    if quantization:
+        keys = np.concatenate(quantize_keys) if quantize_keys else np.zeros(0, dtype=np.uint64)
+        quantize_vectors(collection, embedding_cache, quantize_ids, keys, quantization,
+                         quantized_path(persist_directory))
+    elif quantized_path(persist_directory).exists():
+        # A quantized index from an earlier build would no longer match the collection
+        shutil.rmtree(quantized_path(persist_directory))
+        print("Removed stale quantized vector index")
+    save_manifest(persist_directory, current_hashes, manifest["version"])
     return collection
 
+def quantize_vectors(collection, embedding_cache: EmbeddingCache, ids: List[str], keys: np.ndarray,
+                     mode: str, directory: Path, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Write the quantized vector index for ``ids`` from their cached embeddings.
+
+    Trials whose text is missing from the cache (indexed before it existed)
+    have their vectors read back from Chroma and cached first.
+    """
+    rows = embedding_cache.lookup(keys)
+    missing = np.flatnonzero(rows < 0)
+    for start_idx in range(0, len(missing), batch_size):
+        chunk = missing[start_idx:start_idx + batch_size]
+        result = collection.get(ids=[ids[i] for i in chunk], include=["embeddings"])
+        position = {trial_id: i for i, trial_id in enumerate(result["ids"])}
+        vectors = np.asarray([result["embeddings"][position[ids[i]]] for i in chunk], dtype=np.float32)
+        embedding_cache.append(keys[chunk], vectors)
+    if len(missing):
+        print(f"Cached {len(missing)} embeddings read back from Chroma")
+        embedding_cache.save()
+        rows = embedding_cache.lookup(keys)
+    
+    build_quantized_index(directory, ids, embedding_cache, rows, mode=mode)
+    size_mb = sum(path.stat().st_size for path in Path(directory).iterdir()) / 1e6
+    print(f"Wrote {mode} quantized vectors for {len(ids)} trials ({size_mb:.1f} MB)")
+
 if __name__ == "__main__":
     deployment_env = os.getenv("DEPLOYMENT_ENV", "cloud")
     
@@ -90,9 +232,26 @@ if __name__ == "__main__":
     print(f"Loading data from: {data_path}")
     print(f"Creating index in: {chroma_path}")
     
-    # Load the data
-    df = load_clinical_trials(str(data_path))
-    print(f"Loaded {len(df)} trials")
+    incremental = os.getenv("INDEX_MODE", "full") == "incremental"
+    batch_size = int(os.getenv("INDEX_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    workers = int(os.environ["INDEX_WORKERS"]) if "INDEX_WORKERS" in os.environ else None
+    
+    # INDEX_DEDUP=1 groups near-duplicate trials in a first, embedding-free pass
+    dup_groups = None
+    if os.getenv("INDEX_DEDUP", "0") == "1":
+        threshold = float(os.getenv("INDEX_DEDUP_THRESHOLD", 0.8))
+        dup_groups = find_duplicate_groups(iter_clinical_trials(str(data_path), batch_size),
+                                           threshold=threshold, workers=workers)
+    
+    # Stream the data straight into the vector store (INDEX_MODE=incremental updates it in place)
+    trials = iter_clinical_trials(str(data_path), batch_size)
+    use_embedding_cache = os.getenv("INDEX_EMBEDDING_CACHE", "1") == "1"
+    # INDEX_QUANTIZATION=float16|int8|pq also writes quantized vectors for low-memory serving
+    quantization = os.getenv("INDEX_QUANTIZATION", "none")
+    quantization = None if quantization == "none" else quantization
+    create_vector_store(trials, str(chroma_path), incremental=incremental, batch_size=batch_size, workers=workers,
+                        dup_groups=dup_groups, use_embedding_cache=use_embedding_cache, quantization=quantization)
     
-    # Create the vector store
-    create_vector_store(df, str(chroma_path))
+    peak_rss = peak_rss_mb()
+    if peak_rss:
+        print(f"Peak RSS: {peak_rss['main']:.1f} MB (indexer), {peak_rss['workers']:.1f} MB (largest worker)")
@@ -0,0 +1,190 @@
+"""Near-duplicate detection for trial documents with MinHash and LSH banding.
+
+Sub-studies and re-registrations produce near-identical documents. Each
+document gets a MinHash signature over hashed word 3-shingles; signatures
+are split into bands, and only documents that share a band bucket are
+compared, so grouping takes a sort per band rather than comparing all
+pairs. Candidates whose estimated Jaccard similarity reaches the threshold
+are merged into one group, represented by its first trial.
+
+Signatures are computed in worker processes; the parent holds them all
+(``num_perm`` * 4 bytes per trial) and groups them at the end.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import multiprocessing
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from src.indexer.documents import build_documents
+from src.rag.bm25 import tokenize
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+SHINGLE_SIZE = 3
+
+
+def _permutations(num_perm: int, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Multiply-shift hash parameters: odd 64-bit multipliers and offsets."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """64-bit hashes of the word ``size``-shingles of a text (the whole text if shorter)."""
+    tokens = np.array([zlib.crc32(token.encode()) for token in tokenize(text)], dtype=np.uint64)
+    if len(tokens) < size:
+        return np.unique(tokens)
+    combined = np.zeros(len(tokens) - size + 1, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(size):
+            combined = combined * np.uint64(0x100000001B3) ^ tokens[offset:len(tokens) - size + 1 + offset]
+    return np.unique(combined)
+
+
+def minhash_signatures(documents: Sequence[str], num_perm: int = DEFAULT_NUM_PERM, seed: int = 1) -> np.ndarray:
+    """MinHash signatures, one uint32 row of ``num_perm`` values per document."""
+    a, b = _permutations(num_perm, seed)
+    signatures = np.full((len(documents), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for i, document in enumerate(documents):
+            hashes = shingle_hashes(document)
+            if len(hashes):
+                # High 32 bits of a * h + b (mod 2^64) for every permutation and shingle
+                values = (a[:, None] * hashes[None, :] + b[:, None]) >> np.uint64(32)
+                signatures[i] = values.min(axis=1)
+    return signatures
+
+
+def choose_bands(num_perm: int, threshold: float) -> int:
+    """
+    Pick the band count for ``num_perm`` permutations.
+
+    With ``bands`` bands of ``rows`` rows, pairs become candidates around
+    similarity (1 / bands) ** (1 / rows). The largest such threshold still
+    at or below ``threshold`` is chosen, so true duplicates are rarely
+    missed and the exact signature check removes false candidates.
+    """
+    best = num_perm
+    for bands in range(num_perm, 0, -1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = bands
+    return best
+
+
+def _band_hashes(signatures: np.ndarray, band: int, rows: int) -> np.ndarray:
+    """One 64-bit hash per document for one band of its signature."""
+    hashes = np.zeros(len(signatures), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in range(band * rows, (band + 1) * rows):
+            hashes = hashes * np.uint64(0x100000001B3) ^ signatures[:, column].astype(np.uint64)
+    return hashes
+
+
+def group_signatures(signatures: np.ndarray, threshold: float = DEFAULT_THRESHOLD,
+                     bands: Optional[int] = None, chunk_size: int = 1 << 20) -> np.ndarray:
+    """
+    Assign every document (signature row) to a near-duplicate group.
+
+    Per band, rows are sorted by band hash; each row in a bucket is checked
+    against the bucket's first row, and pairs whose estimated Jaccard
+    similarity reaches ``threshold`` are merged. Returns, for each row, the
+    first row of its group.
+    """
+    n_docs, num_perm = signatures.shape
+    bands = bands or choose_bands(num_perm, threshold)
+    rows = num_perm // bands
+    parent = np.arange(n_docs)
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for band in range(bands):
+        hashes = _band_hashes(signatures, band, rows)
+        order = np.argsort(hashes, kind="stable")
+        sorted_hashes = hashes[order]
+        bucket_starts = np.searchsorted(sorted_hashes, sorted_hashes, side="left")
+        candidates = np.flatnonzero(bucket_starts != np.arange(n_docs))
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            leaders, members = order[bucket_starts[chunk]], order[chunk]
+            similar = (signatures[leaders] == signatures[members]).mean(axis=1) >= threshold
+            for leader, member in zip(leaders[similar], members[similar]):
+                leader_root, member_root = find(leader), find(member)
+                if leader_root != member_root:
+                    # The earlier row stays the representative
+                    parent[max(leader_root, member_root)] = min(leader_root, member_root)
+
+    return np.array([find(row) for row in range(n_docs)])
+
+
+def batch_signatures(batch: pd.DataFrame, num_perm: int = DEFAULT_NUM_PERM) -> Tuple[List[str], np.ndarray]:
+    """Trial ids and MinHash signatures of one batch. Runs in a worker process."""
+    documents, ids, _ = build_documents(batch)
+    return ids, minhash_signatures(documents, num_perm)
+
+
+def find_duplicate_groups(
+    batches: Iterable[pd.DataFrame],
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = DEFAULT_NUM_PERM,
+    workers: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Group near-duplicate trials across all batches.
+
+    Returns the representative trial id for every trial that has at least
+    one near-duplicate (representatives map to themselves); trials without
+    duplicates are left out. ``workers=0`` computes signatures inline.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ids = []
+    signature_batches = []
+    seen = set()
+
+    def collect(batch_ids, signatures):
+        # First occurrence wins, as in the pipeline
+        keep = []
+        for i, trial_id in enumerate(batch_ids):
+            if trial_id not in seen:
+                seen.add(trial_id)
+                keep.append(i)
+        ids.extend(batch_ids[i] for i in keep)
+        signature_batches.append(signatures[keep])
+
+    if workers == 0:
+        for batch in tqdm(batches, desc="Finding duplicates"):
+            collect(*batch_signatures(batch, num_perm))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            for batch in tqdm(batches, desc="Finding duplicates"):
+                pending.append(pool.submit(batch_signatures, batch, num_perm))
+                while len(pending) >= 2 * workers:
+                    collect(*pending.popleft().result())
+            while pending:
+                collect(*pending.popleft().result())
+
+    if not ids:
+        return {}
+    representatives = group_signatures(np.concatenate(signature_batches), threshold)
+    group_sizes = np.bincount(representatives, minlength=len(ids))
+    grouped = np.flatnonzero(group_sizes[representatives] > 1)
+    groups = {ids[row]: ids[representatives[row]] for row in grouped}
+    n_groups = int(np.count_nonzero(group_sizes > 1))
+    print(f"Found {n_groups} near-duplicate groups covering {len(groups)} of {len(ids)} trials")
+    return groups
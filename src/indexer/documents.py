@@ -0,0 +1,131 @@
+"""Columnar document and metadata building for the trial index."""
+from typing import Dict, List, Tuple
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+
+from src.rag.filters import PHASE_FLAGS, normalize_key, phase_flags_for
+
+# Columns the indexer reads; every other column of the export is skipped
+INDEX_COLUMNS = [
+    "NCT Number",
+    "Brief Title",
+    "Full Title",
+    "Conditions",
+    "Intervention Description",
+    "Overall Status",
+    "Phases",
+    "Primary Purpose",
+    "Start Date",
+]
+
+# Names other exports (including data/clin_trials_demo.csv) use for the same columns
+COLUMN_ALIASES = {
+    "Official Title": "Full Title",
+    "Interventions": "Intervention Description",
+}
+
+# Metadata key -> source column, in the order the index has always stored them
+METADATA_COLUMNS = {
+    "brief_title": "Brief Title",
+    "status": "Overall Status",
+    "phase": "Phases",
+    "condition": "Conditions",
+    "purpose": "Primary Purpose",
+    "start_date": "Start Date",
+}
+
+
+def _as_text(series: pd.Series) -> np.ndarray:
+    """Render a column the way ``str(value)`` would, missing values included."""
+    return series.to_numpy(dtype=object).astype(str).astype(object)
+
+
+def is_index_column(column: str) -> bool:
+    """Whether a CSV column is needed by the indexer (``usecols`` predicate)."""
+    return column in INDEX_COLUMNS or column in COLUMN_ALIASES
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Rename aliased columns and add any missing index columns as empty."""
+    renames = {alias: column for alias, column in COLUMN_ALIASES.items()
+               if alias in df.columns and column not in df.columns}
+    if renames:
+        df = df.rename(columns=renames)
+    missing = [column for column in INDEX_COLUMNS if column not in df.columns]
+    if missing:
+        df = df.assign(**{column: np.nan for column in missing})
+    return df
+
+
+def trial_ids(batch: pd.DataFrame) -> List[str]:
+    """Return index ids for a batch: the NCT Number, or the row index when missing."""
+    # Trials are keyed by NCT Number so re-indexing can match them across runs
+    ids = batch.index.astype(str).to_numpy(dtype=object)
+    if "NCT Number" in batch.columns:
+        nct = batch["NCT Number"]
+        ids = np.where(nct.notna().to_numpy(), _as_text(nct), ids)
+    return ids.tolist()
+
+
+def _map_unique(series: pd.Series, func) -> np.ndarray:
+    """Apply ``func`` once per distinct value; category columns repeat heavily."""
+    codes, uniques = pd.factorize(series.astype(object).fillna("").astype(str))
+    return np.array([func(value) for value in uniques], dtype=object)[codes]
+
+
+def filter_metadata(batch: pd.DataFrame) -> Dict[str, List]:
+    """
+    Normalized, filterable metadata columns for a batch.
+
+    ``status_key`` and ``purpose_key`` hold normalized categories, one
+    boolean flag per phase handles multi-phase values such as
+    "Phase 2|Phase 3", and ``start_date_num`` encodes the start date as
+    YYYYMMDD (0 when unknown) so range filters work.
+    """
+    columns = {
+        "status_key": _map_unique(batch["Overall Status"], normalize_key).tolist(),
+        "purpose_key": _map_unique(batch["Primary Purpose"], normalize_key).tolist(),
+    }
+    phase_flags = _map_unique(batch["Phases"], phase_flags_for)
+    for position, flag in enumerate(PHASE_FLAGS):
+        columns[flag] = [flags[position] for flags in phase_flags]
+    dates = pd.to_datetime(batch["Start Date"], errors="coerce", format="mixed")
+    start_date_num = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    columns["start_date_num"] = start_date_num.fillna(0).astype(int).tolist()
+    return columns
+
+
+def build_documents(batch: pd.DataFrame) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Build document texts, ids and metadata for a whole batch of trials at once.
+
+    Produces the same text and metadata as the previous per-row ``iterrows``
+    loop, using column-wise NumPy string operations instead of Python-level
+    row access. Ids are NCT Numbers (row index when missing), also stored
+    as ``nct_id`` metadata, and ``filter_metadata`` fields are added for
+    structured filtering.
+    """
+    intervention = batch["Intervention Description"]
+    documents = (
+        "Brief Title: " + _as_text(batch["Brief Title"]) + "\n\n"
+        + "Full Title: " + _as_text(batch["Full Title"]) + "\n\n"
+        + "Conditions: " + _as_text(batch["Conditions"]) + "\n\n"
+        + np.where(intervention.notna().to_numpy(), "Intervention: " + _as_text(intervention), "")
+    )
+
+    ids = trial_ids(batch)
+    columns = {key: _as_text(batch[column]).tolist() for key, column in METADATA_COLUMNS.items()}
+    columns["nct_id"] = ids
+    columns.update(filter_metadata(batch))
+    keys = list(columns)
+    metadatas = [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+    return documents.tolist(), ids, metadatas
+
+
+def document_hash(document: str, metadata: Dict) -> str:
+    """Fingerprint a trial's indexed content (document text plus metadata)."""
+    payload = document + "\x00" + json.dumps(metadata, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,262 @@
+"""Pipelined indexing: parallel document building and embedding, one Chroma writer."""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+import multiprocessing
+import os
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from src.indexer.documents import build_documents, document_hash, trial_ids
+from src.rag.embedding_cache import EmbeddingCache, text_keys
+from src.rag.embeddings import embedding_model_name, get_embedding_function
+
+DEFAULT_BATCH_SIZE = 500
+
+# Model behind the embedding function (see rag.embeddings); part of the embedding cache key
+EMBEDDING_MODEL = embedding_model_name()
+
+# Per-process embedding function and cache snapshot, created on first use inside each worker
+_embedding_function = None
+_embedding_caches = {}
+
+
+def _get_embedding_function():
+    """Return the embedding function queries use (Chroma's default unless ``EMBEDDING_BACKEND`` says otherwise)."""
+    global _embedding_function
+    if _embedding_function is None:
+        _embedding_function = get_embedding_function()
+    return _embedding_function
+
+
+def _get_embedding_cache(directory: str) -> EmbeddingCache:
+    """Return this process's read-only view of the embedding cache, reopened once it is saved."""
+    cache = _embedding_caches.get(directory)
+    if cache is None or cache.version != cache.current_version():
+        cache = _embedding_caches[directory] = EmbeddingCache(directory, EMBEDDING_MODEL)
+    return cache
+
+
+def embed_documents(documents: List[str], cache_directory: Optional[str] = None) -> Dict:
+    """
+    Embed documents, reusing cached vectors where the text was embedded before.
+
+    Returns the ``embeddings`` (float32, one row per document) plus the
+    ``cache_keys`` and ``cache_vectors`` of newly embedded texts for the
+    writer to append to the cache. Repeated texts are embedded once.
+    """
+    keys = text_keys(documents)
+    embeddings = np.zeros((len(documents), 0), dtype=np.float32)
+    rows = np.full(len(documents), -1, dtype=np.int64)
+    if cache_directory is not None:
+        cache = _get_embedding_cache(cache_directory)
+        rows = cache.lookup(keys)
+        if (rows >= 0).any():
+            cached = cache.get(rows[rows >= 0])
+            embeddings = np.zeros((len(documents), cached.shape[1]), dtype=np.float32)
+            embeddings[rows >= 0] = cached
+
+    missing = np.flatnonzero(rows < 0)
+    new_keys, first = np.unique(keys[missing], return_index=True)
+    new_vectors = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+    if len(new_keys):
+        new_vectors = np.asarray(_get_embedding_function()([documents[i] for i in missing[first]]),
+                                 dtype=np.float32)
+        if not embeddings.shape[1]:
+            embeddings = np.zeros((len(documents), new_vectors.shape[1]), dtype=np.float32)
+        embeddings[missing] = new_vectors[np.searchsorted(new_keys, keys[missing])]
+
+    return {
+        "embeddings": embeddings,
+        "cache_keys": new_keys,
+        "cache_vectors": new_vectors,
+        "cache_hits": len(documents) - len(missing),
+    }
+
+
+def iter_batches(df: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterable[pd.DataFrame]:
+    """Slice an in-memory DataFrame into indexer batches."""
+    for start_idx in range(0, len(df), batch_size):
+        yield df.iloc[start_idx:start_idx + batch_size]
+
+
+def prepare_batch(batch: pd.DataFrame, known_hashes: Optional[Dict[str, str]] = None,
+                  dup_groups: Optional[Dict[str, str]] = None,
+                  cache_directory: Optional[str] = None) -> Dict:
+    """
+    Build, fingerprint and embed one batch. Runs in a worker process.
+
+    With a ``cache_directory``, texts found in the embedding cache are not
+    embedded again.
+
+    Every trial gets ``dup_group`` metadata: its near-duplicate group's
+    representative id from ``dup_groups``, else its own id. Upserts keep
+    metadata keys they are not given, so a trial leaving a group must
+    overwrite its old value.
+
+    Only trials whose hash differs from ``known_hashes`` are embedded; their
+    positions are listed in ``changed``. With no ``known_hashes`` every trial
+    counts as changed.
+    """
+    documents, ids, metadatas = build_documents(batch)
+    dup_groups = dup_groups or {}
+    for trial_id, metadata in zip(ids, metadatas):
+        metadata["dup_group"] = dup_groups.get(trial_id, trial_id)
+    hashes = [document_hash(document, metadata) for document, metadata in zip(documents, metadatas)]
+
+    if known_hashes is None:
+        changed = list(range(len(ids)))
+    else:
+        changed = [i for i, (trial_id, digest) in enumerate(zip(ids, hashes))
+                   if known_hashes.get(trial_id) != digest]
+
+    prepared = {
+        "ids": ids,
+        "documents": documents,
+        "metadatas": metadatas,
+        "hashes": hashes,
+        "changed": changed,
+        "embeddings": None,
+    }
+    if changed:
+        prepared.update(embed_documents([documents[i] for i in changed], cache_directory))
+    return prepared
+
+
+def run_pipeline(
+    batches: Iterable[pd.DataFrame],
+    write: Callable,
+    known_hashes: Optional[Dict[str, str]] = None,
+    workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    total: Optional[int] = None,
+    batch_callbacks: Sequence[Callable] = (),
+    dup_groups: Optional[Dict[str, str]] = None,
+    embedding_cache: Optional[EmbeddingCache] = None,
+) -> Dict[str, str]:
+    """
+    Stream batches through a process pool into a single writer thread.
+
+    ``write`` is the collection method used for persistence (``add`` or
+    ``upsert``) and is only ever called from the writer thread. At most
+    ``max_pending`` prepared batches are held between the pool and the
+    writer, so a slow writer throttles the pool instead of growing memory.
+    ``workers=0`` prepares batches inline, without a process pool.
+
+    Each of ``batch_callbacks`` is called from the writer thread as
+    ``callback(ids, documents, metadatas)`` with every trial seen, changed
+    or not, so side indexes can be built in the same pass.
+
+    ``dup_groups`` maps trial ids to near-duplicate group representatives
+    (see ``dedup.find_duplicate_groups``); workers only receive their
+    batch's share.
+
+    Workers reuse vectors from ``embedding_cache`` as it was when the run
+    started; newly embedded texts are appended to it by the writer thread.
+    The caller publishes them with ``embedding_cache.save()``.
+
+    Returns the content hash of every trial seen, keyed by trial id.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * max(workers, 1)
+
+    prepared_batches = queue.Queue(maxsize=max_pending)
+    current_hashes = {}
+    errors = []
+
+    def writer():
+        while True:
+            prepared = prepared_batches.get()
+            if prepared is None:
+                return
+            if errors:
+                continue  # keep draining so the producer never blocks
+            try:
+                _write_prepared(prepared, write, current_hashes, batch_callbacks)
+                if embedding_cache is not None and prepared.get("cache_keys") is not None:
+                    embedding_cache.append(prepared["cache_keys"], prepared["cache_vectors"])
+                    embedding_cache.hits += prepared["cache_hits"]
+            except BaseException as e:
+                errors.append(e)
+
+    writer_thread = threading.Thread(target=writer, name="chroma-writer", daemon=True)
+    writer_thread.start()
+    cache_directory = str(embedding_cache.directory.parent) if embedding_cache is not None else None
+
+    def known_for(batch):
+        if known_hashes is None:
+            return None
+        return {trial_id: known_hashes[trial_id] for trial_id in trial_ids(batch) if trial_id in known_hashes}
+
+    def groups_for(batch):
+        if not dup_groups:
+            return None
+        return {trial_id: dup_groups[trial_id] for trial_id in trial_ids(batch) if trial_id in dup_groups}
+
+    try:
+        if workers == 0:
+            for batch in tqdm(batches, total=total, desc="Processing batches"):
+                prepared_batches.put(prepare_batch(batch, known_for(batch), groups_for(batch), cache_directory))
+                if errors:
+                    break
+        else:
+            # Spawned workers avoid forking a process that holds Chroma's threads
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                pending = deque()
+                for batch in tqdm(batches, total=total, desc="Processing batches"):
+                    pending.append(pool.submit(prepare_batch, batch, known_for(batch), groups_for(batch),
+                                               cache_directory))
+                    while len(pending) >= max_pending:
+                        prepared_batches.put(pending.popleft().result())
+                    if errors:
+                        break
+                while pending and not errors:
+                    prepared_batches.put(pending.popleft().result())
+                for future in pending:
+                    future.cancel()
+    finally:
+        prepared_batches.put(None)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+    return current_hashes
+
+
+def _write_prepared(prepared: Dict, write: Callable, current_hashes: Dict[str, str],
+                    batch_callbacks: Sequence[Callable] = ()):
+    """Persist the changed trials of one prepared batch and record its hashes."""
+    seen = []
+    to_write = []
+    embeddings = []
+    changed = dict(zip(prepared["changed"], range(len(prepared["changed"]))))
+    for i, (trial_id, digest) in enumerate(zip(prepared["ids"], prepared["hashes"])):
+        # First occurrence wins for ids repeated in the export
+        if trial_id in current_hashes:
+            continue
+        current_hashes[trial_id] = digest
+        seen.append(i)
+        if i in changed:
+            to_write.append(i)
+            embeddings.append(prepared["embeddings"][changed[i]])
+
+    if to_write:
+        write(
+            ids=[prepared["ids"][i] for i in to_write],
+            documents=[prepared["documents"][i] for i in to_write],
+            metadatas=[prepared["metadatas"][i] for i in to_write],
+            embeddings=np.asarray(embeddings).tolist(),
+        )
+
+    for callback in batch_callbacks:
+        callback(
+            [prepared["ids"][i] for i in seen],
+            [prepared["documents"][i] for i in seen],
+            [prepared["metadatas"][i] for i in seen],
+        )
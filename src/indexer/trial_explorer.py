@@ -0,0 +1,196 @@
+"""SQLite trial table for the Trial Explorer: filtered, sorted pages with total counts.
+
+Build it once from the CSV export (the app also builds it on first use):
+    python -m src.indexer.trial_explorer data/clin_trials.csv
+
+This writes ``data/clin_trials.sqlite`` with every CSV column as text, B-tree
+indexes on the filter and sort columns, and an FTS5 full-text index over the
+titles, conditions and interventions. ``TrialExplorer.page`` then returns
+one page (``offset``/``limit``) plus the total number of matches, so the UI
+only ever holds and sends the visible rows. Connections are opened
+read-only per call, so one explorer can be shared across Streamlit sessions.
+"""
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import pandas as pd
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+from src.indexer.trial_store import has_fresh_store, iter_store_batches
+
+# Columns to index for filtering and sorting, when the export has them
+INDEXED_COLUMNS = ["NCT Number", "Brief Title", "Overall Status", "Phases", "Primary Purpose", "Start Date"]
+# Columns covered by text search
+SEARCH_COLUMNS = ["NCT Number", "Brief Title", "Official Title", "Full Title", "Conditions",
+                  "Interventions", "Intervention Description"]
+
+
+def explorer_path(csv_path: Union[str, Path]) -> Path:
+    """Return the explorer database location for a CSV export."""
+    return Path(csv_path).with_suffix(".sqlite")
+
+
+def has_fresh_explorer(csv_path: Union[str, Path]) -> bool:
+    """Whether an explorer database exists that is at least as new as the CSV."""
+    path = explorer_path(csv_path)
+    if not path.exists():
+        return False
+    csv_path = Path(csv_path)
+    return not csv_path.exists() or path.stat().st_mtime >= csv_path.stat().st_mtime
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _iter_csv_batches(csv_path: Union[str, Path], batch_size: int) -> Iterator[pd.DataFrame]:
+    if has_fresh_store(csv_path):
+        yield from iter_store_batches(csv_path, batch_size=batch_size)
+        return
+    with pd.read_csv(csv_path, dtype=str, chunksize=batch_size) as reader:
+        yield from reader
+
+
+def build_explorer(csv_path: Union[str, Path], batch_size: int = 50_000) -> Path:
+    """Write the explorer database for a CSV export, streaming it batch by batch."""
+    csv_path = Path(csv_path)
+    columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    search_columns = [column for column in SEARCH_COLUMNS if column in columns]
+    output = explorer_path(csv_path)
+    # A private temporary file per build, so concurrent builds (e.g. two Streamlit
+    # workers starting together) never write into each other's database
+    with tempfile.NamedTemporaryFile(dir=output.parent, prefix=output.name + ".", suffix=".tmp",
+                                     delete=False) as tmp_file:
+        tmp_output = Path(tmp_file.name)
+
+    connection = sqlite3.connect(tmp_output)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute(f"CREATE TABLE trials ({', '.join(_quote(c) + ' TEXT' for c in columns)})")
+        insert = (f"INSERT INTO trials ({', '.join(map(_quote, columns))}) "
+                  f"VALUES ({', '.join('?' * len(columns))})")
+        for batch in _iter_csv_batches(csv_path, batch_size):
+            batch = batch.reindex(columns=columns).astype(object)
+            connection.executemany(insert, batch.where(batch.notna(), None).itertuples(index=False, name=None))
+
+        for column in INDEXED_COLUMNS:
+            if column in columns:
+                name = "idx_" + re.sub(r"\W+", "_", column.lower())
+                connection.execute(f"CREATE INDEX {name} ON trials ({_quote(column)})")
+        if search_columns:
+            connection.execute(f"CREATE VIRTUAL TABLE trials_fts USING fts5("
+                               f"{', '.join(map(_quote, search_columns))}, content='trials', content_rowid='rowid')")
+            connection.execute("INSERT INTO trials_fts(trials_fts) VALUES ('rebuild')")
+        connection.execute("ANALYZE")
+        connection.commit()
+    except BaseException:
+        connection.close()
+        tmp_output.unlink(missing_ok=True)
+        raise
+    connection.close()
+    os.replace(tmp_output, output)
+    return output
+
+
+def search_expression(text: str) -> Optional[str]:
+    """FTS5 query matching every word of ``text`` as a prefix; None when it has no words."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words) if words else None
+
+
+class TrialExplorer:
+    """Read-only queries over an explorer database."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with closing(self._connect()) as connection:
+            self.columns = [row[1] for row in connection.execute("PRAGMA table_info(trials)")]
+            self.searchable = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'trials_fts'").fetchone() is not None
+
+    @classmethod
+    def for_csv(cls, csv_path: Union[str, Path]) -> "TrialExplorer":
+        """Open the explorer for a CSV export, (re)building it when missing or stale."""
+        if not has_fresh_explorer(csv_path):
+            print(f"Building trial explorer database for {csv_path}")
+            build_explorer(csv_path)
+        return cls(explorer_path(csv_path))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def _column(self, column: str) -> str:
+        if column not in self.columns:
+            raise ValueError(f"Unknown column: {column}")
+        return _quote(column)
+
+    def _where(self, search: Optional[str], filters: Optional[Dict]):
+        """SQL condition and parameters for a text search plus ``{column: value or [values]}`` filters."""
+        clauses, params = [], []
+        for column, value in (filters or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{self._column(column)} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        expression = search_expression(search) if search and self.searchable else None
+        if expression:
+            clauses.append("rowid IN (SELECT rowid FROM trials_fts WHERE trials_fts MATCH ?)")
+            params.append(expression)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def page(self, search: Optional[str] = None, filters: Optional[Dict] = None,
+             sort_by: Optional[str] = None, descending: bool = False,
+             offset: int = 0, limit: int = 50) -> Dict:
+        """
+        One page of matching trials and the total number of matches.
+
+        Returns ``{"rows": DataFrame, "total": int, "offset": int, "limit": int}``.
+        Rows are ordered by ``sort_by`` (file order when None) with missing
+        values last, and file order breaking ties so pages never overlap.
+        """
+        where, params = self._where(search, filters)
+        direction = "DESC" if descending else "ASC"
+        if sort_by:
+            column = self._column(sort_by)
+            # Missing values last in either direction, file order breaking ties
+            order = f"{column} IS NULL, {column} {direction}, rowid {direction}"
+        else:
+            order = "rowid"
+        with closing(self._connect()) as connection:
+            total = connection.execute(f"SELECT COUNT(*) FROM trials{where}", params).fetchone()[0]
+            rows = pd.read_sql_query(
+                f"SELECT {', '.join(map(_quote, self.columns))} FROM trials{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                connection, params=params + [int(limit), int(offset)],
+            )
+        return {"rows": rows, "total": total, "offset": offset, "limit": limit}
+
+    def count(self, search: Optional[str] = None, filters: Optional[Dict] = None) -> int:
+        """Number of trials matching the search and filters."""
+        where, params = self._where(search, filters)
+        with closing(self._connect()) as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM trials{where}", params).fetchone()[0]
+
+    def value_counts(self, column: str, search: Optional[str] = None,
+                     filters: Optional[Dict] = None) -> Dict[str, int]:
+        """Matching trials per value of ``column``, most common first (missing values skipped)."""
+        where, params = self._where(search, filters)
+        quoted = self._column(column)
+        where += (" AND " if where else " WHERE ") + f"{quoted} IS NOT NULL"
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT {quoted}, COUNT(*) AS n FROM trials{where} GROUP BY {quoted} ORDER BY n DESC", params)
+            return dict(rows.fetchall())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m src.indexer.trial_explorer <path/to/trials.csv>")
+        sys.exit(1)
+    output = build_explorer(sys.argv[1])
+    print(f"Wrote trial explorer database to {output}")
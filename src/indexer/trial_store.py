@@ -0,0 +1,129 @@
+"""Columnar on-disk trial store (Arrow IPC) with memory-mapped reads.
+
+Convert the CSV export once:
+    python -m src.indexer.trial_store data/clin_trials.csv
+
+Readers then open ``data/clin_trials.arrow`` memory-mapped and only touch the
+columns they ask for. Since the file is mapped read-only, its pages are shared
+by every process that opens it (e.g. Streamlit workers). When the store is
+missing, stale or pyarrow is not installed, readers fall back to the CSV.
+"""
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Union
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Optional pyarrow import with fallback to CSV parsing
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+Columns = Optional[Union[List[str], Callable[[str], bool]]]
+
+
+def store_path(csv_path: Union[str, Path]) -> Path:
+    """Return the Arrow store location for a CSV export."""
+    return Path(csv_path).with_suffix(".arrow")
+
+
+def has_fresh_store(csv_path: Union[str, Path]) -> bool:
+    """Whether a usable store exists that is at least as new as the CSV."""
+    path = store_path(csv_path)
+    if not PYARROW_AVAILABLE or not path.exists():
+        return False
+    csv_path = Path(csv_path)
+    return not csv_path.exists() or path.stat().st_mtime >= csv_path.stat().st_mtime
+
+
+def convert_csv_to_store(csv_path: Union[str, Path], block_size: int = 16 << 20) -> Path:
+    """
+    Write the CSV as an uncompressed Arrow IPC file, streaming block by block.
+
+    Every column is stored as a nullable string, matching how the indexer
+    reads the CSV. Uncompressed record batches can be memory-mapped directly.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to build the trial store")
+
+    csv_path = Path(csv_path)
+    column_names = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in column_names},
+            strings_can_be_null=True,
+        ),
+    )
+
+    output = store_path(csv_path)
+    tmp_output = output.with_suffix(".arrow.tmp")
+    with pa.OSFile(str(tmp_output), "wb") as sink:
+        with pa_ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    os.replace(tmp_output, output)
+    return output
+
+
+def open_trial_table(path: Union[str, Path], columns: Columns = None) -> "pa.Table":
+    """Open the store memory-mapped, selecting ``columns`` without copying."""
+    source = pa.memory_map(str(path), "r")
+    table = pa_ipc.open_file(source).read_all()
+    return table.select(_select_columns(table.schema.names, columns))
+
+
+def _to_pandas(data: Union["pa.Table", "pa.RecordBatch"]) -> pd.DataFrame:
+    """Convert to pandas with missing values as NaN, the way ``pd.read_csv`` returns them."""
+    df = data.to_pandas()
+    # Arrow turns nulls in string columns into None; str(None) would index as "None", not "nan"
+    for column in df.columns[df.dtypes == object]:
+        if df[column].isna().any():
+            df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def read_trials(csv_path: Union[str, Path], columns: Columns = None, **csv_kwargs) -> pd.DataFrame:
+    """
+    Read the trial table, from the Arrow store when fresh, else from the CSV.
+
+    ``columns`` is a list of names or a predicate, as for ``pd.read_csv``'s
+    ``usecols``; ``csv_kwargs`` only apply to the CSV fallback.
+    """
+    if has_fresh_store(csv_path):
+        return _to_pandas(open_trial_table(store_path(csv_path), columns))
+    return pd.read_csv(csv_path, usecols=columns, **csv_kwargs)
+
+
+def iter_store_batches(csv_path: Union[str, Path], columns: Columns = None,
+                       batch_size: int = 500) -> Iterator[pd.DataFrame]:
+    """Yield DataFrame batches from the store; the row index continues across batches."""
+    table = open_trial_table(store_path(csv_path), columns)
+    offset = 0
+    for record_batch in table.to_batches(max_chunksize=batch_size):
+        batch = _to_pandas(record_batch)
+        batch.index = pd.RangeIndex(offset, offset + len(batch))
+        offset += len(batch)
+        yield batch
+
+
+def _select_columns(names: List[str], columns: Columns) -> List[str]:
+    if columns is None:
+        return names
+    if callable(columns):
+        return [name for name in names if columns(name)]
+    return [name for name in columns if name in names]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m src.indexer.trial_store <path/to/trials.csv>")
+        sys.exit(1)
+    output = convert_csv_to_store(sys.argv[1])
+    print(f"Wrote trial store to {output}")
@@ -1,11 +1,28 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator, List
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+import asyncio
+import importlib.util
 import os
-from langchain.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
-from langchain_community.chat_models import ChatOpenAI
-from langchain_community.llms import Ollama, HuggingFaceHub
-from chromadb import Client, Settings
+import threading
+import time
+
+from .bm25 import BM25Index, bm25_path, mentioned_ids, reciprocal_rank_fusion
+from .cache import QueryCache
+from .embedding_cache import embedding_cache_path
+from .embeddings import get_embedding_function
+from .filters import build_where, filters_key, parse_filters
+from .manifest import manifest_path
+from .quantized import QuantizedIndex, quantized_path
+from .rerank import RerankStage, get_reranker, select_hits
+from .tracing import Tracer
+
+# langchain and chromadb take seconds to import; they are imported on first use,
+# but checked here so apps can still fall back to the simple assistant
+for _module in ("langchain", "langchain_community"):
+    if importlib.util.find_spec(_module) is None:
+        raise ImportError(f"{_module} is required for ClinicalTrialAssistant")
 
 # Load environment variables (optional)
 try:
@@ -14,12 +31,44 @@ try:
 except ImportError:
     pass  # dotenv is optional
 
-# Optional ChromaDB import with fallback
-try:
+# Optional ChromaDB support (imported lazily)
+CHROMADB_AVAILABLE = importlib.util.find_spec("chromadb") is not None
+
+PROMPT_TEMPLATE = """You are a helpful clinical trial assistant. Use the following context about clinical trials to answer the question. Be concise and focus on the most relevant trials.
+            
+Context about clinical trials:
+{context}
+
+Question: {question}
+
+Instructions:
+1. If the context doesn't contain enough information to answer the question confidently, respond with "I don't have enough information to answer this question accurately."
+2. When answering, include key information such as trial status, phase, and dates when relevant.
+3. Never make assumptions about medical information that isn't explicitly stated in the context.
+4. End your response with "Sources: " followed by the trial IDs [{nct_ids}].
+
+Answer: """
+
+# Appended to a streamed answer when the model fails after it started answering
+STREAM_INTERRUPTED = "\n\n*[The response was interrupted before it finished. Please try again.]*"
+
+# One Chroma client per persist directory for the whole process; creating
+# clients for the same directory from several threads at once is not safe
+_chroma_clients = {}
+_chroma_clients_lock = threading.Lock()
+
+def get_chroma_client(persist_directory: str):
+    """Return the process-wide Chroma client for ``persist_directory``."""
     from chromadb import Client, Settings
-    CHROMADB_AVAILABLE = True
-except ImportError:
-    CHROMADB_AVAILABLE = False
+
+    with _chroma_clients_lock:
+        client = _chroma_clients.get(persist_directory)
+        if client is None:
+            client = _chroma_clients[persist_directory] = Client(Settings(
+                persist_directory=persist_directory,
+                is_persistent=True
+            ))
+        return client
 
 def get_llm(model_name: str = "google/flan-t5-large"):
     """
@@ -28,6 +77,8 @@ def get_llm(model_name: str = "google/flan-t5-large"):
     deployment_env = os.getenv("DEPLOYMENT_ENV", "cloud")
     
     if deployment_env == "local":
+        from langchain_community.llms import Ollama
+
         return Ollama(model=model_name)
     else:
         # Cloud deployment - use HuggingFace's free models
@@ -40,12 +91,91 @@ def get_llm(model_name: str = "google/flan-t5-large"):
             max_length=512
         )
 
+def collapse_duplicates(hits: Dict) -> Dict:
+    """Keep only the best-ranked hit of each near-duplicate group (``dup_group`` metadata)."""
+    seen = set()
+    keep = []
+    for i, (trial_id, metadata) in enumerate(zip(hits["ids"], hits["metadatas"])):
+        group = (metadata or {}).get("dup_group", trial_id)
+        if group not in seen:
+            seen.add(group)
+            keep.append(i)
+    return hits if len(keep) == len(hits["ids"]) else select_hits(hits, keep)
+
 class ClinicalTrialAssistant:
-    def __init__(self, model_name: Optional[str] = None, persist_directory: Optional[str] = None):
-        """Initialize the clinical trial assistant with the appropriate LLM and ChromaDB."""
+    def __init__(self, model_name: Optional[str] = None, persist_directory: Optional[str] = None,
+                 cache_size: int = 256, cache_ttl: Optional[float] = 3600,
+                 semantic_cache_threshold: Optional[float] = 0.92, hybrid: bool = True,
+                 auto_filters: bool = True, reranker="lexical", rerank_candidates: int = 50,
+                 rerank_budget_ms: Optional[float] = 250, context_k: int = 2,
+                 collapse_duplicates: bool = True, vector_index: Optional[str] = None,
+                 rescore_candidates: int = 200, llm=None, background: bool = True,
+                 trace: bool = True, return_timings: bool = False):
+        """Initialize the clinical trial assistant with the appropriate LLM and ChromaDB.
+        
+        Retrieval results and answers are cached per normalized question
+        (``cache_size`` entries each, expiring after ``cache_ttl`` seconds, never
+        for None, immediately for 0) and
+        invalidated whenever the index manifest changes. Paraphrased questions
+        whose embedding has cosine similarity of at least
+        ``semantic_cache_threshold`` with a cached one reuse its answer
+        (``None`` disables this).
+        
+        With ``hybrid`` set and a BM25 index built next to the Chroma store,
+        keyword and vector results are fused by reciprocal rank fusion.
+        
+        Structured filters (see ``filters.py``) restrict retrieval inside
+        Chroma. With ``auto_filters`` set, phases, statuses and start years
+        mentioned in the question are applied too; explicit filters win.
+        
+        ``reranker`` (a name for ``rerank.get_reranker`` or an object with a
+        ``score`` method; ``None`` disables it) rescores
+        ``rerank_candidates`` over-fetched hits before the top ``n_results``
+        are kept, unless retrieval already used up ``rerank_budget_ms``.
+        The best ``context_k`` hits go into the prompt.
+        
+        With ``collapse_duplicates`` set, hits tagged with the same
+        ``dup_group`` by the indexer's near-duplicate pass count once.
+        
+        ``vector_index="quantized"`` (default: the ``VECTOR_INDEX``
+        environment variable, else ``"chroma"``) searches the quantized
+        vectors written with ``INDEX_QUANTIZATION`` instead of Chroma's
+        in-memory HNSW index; the best ``rescore_candidates`` are rescored
+        with full-precision vectors. Chroma is used when no quantized
+        index was built.
+        
+        The Chroma client, embedding model and LLM (unless ``llm`` is given)
+        load on a background thread; the first query waits for them. Pass
+        ``background=False`` to load them before returning.
+        
+        With ``trace`` set, the time spent in each stage (embedding, vector
+        search, BM25, reranking, context assembly, LLM) is recorded for
+        ``latency_stats``; ``return_timings`` also adds a per-response
+        ``timings`` dict (ms per stage).
+        """
         if persist_directory is None:
             persist_directory = str(Path(__file__).parent.parent.parent / "data" / "chroma_db")
         print(f"Initializing ChromaDB with persist_directory: {persist_directory}")
+        self.manifest_path = manifest_path(persist_directory)
+        self.bm25_path = bm25_path(persist_directory)
+        self.quantized_path = quantized_path(persist_directory)
+        self.embedding_cache_path = embedding_cache_path(persist_directory)
+        self.vector_index = vector_index or os.getenv("VECTOR_INDEX", "chroma")
+        self.rescore_candidates = rescore_candidates
+        self.tracer = Tracer(enabled=trace)
+        self.return_timings = return_timings
+        self.quantized = None
+        self.hybrid = hybrid
+        self.auto_filters = auto_filters
+        self.context_k = context_k
+        self.collapse_duplicates = collapse_duplicates
+        if isinstance(reranker, str) or reranker is None:
+            reranker = get_reranker(reranker)
+        self.rerank_stage = RerankStage(reranker, rerank_candidates, rerank_budget_ms) if reranker else None
+        self.bm25 = None
+        self._bm25_version = object()  # forces a load on first query
+        self.cache = QueryCache(maxsize=cache_size, ttl=cache_ttl,
+                                semantic_threshold=semantic_cache_threshold)
         
         # Initialize LLM
         deployment_env = os.getenv("DEPLOYMENT_ENV", "cloud")
@@ -54,78 +184,527 @@ class ClinicalTrialAssistant:
         else:
             self.model_name = model_name or "gpt-3.5-turbo"
         
-        self.llm = get_llm(self.model_name)
-        
-        # Initialize ChromaDB if available
-        if CHROMADB_AVAILABLE:
-            self.client = Client(Settings(
-                persist_directory=persist_directory,
-                is_persistent=True
-            ))
-            
-            # List all collections
-            collections = self.client.list_collections()
-            print(f"Available collections: {[c.name for c in collections]}")
-            
-            try:
-                self.collection = self.client.get_collection("clinical_trials")
-                print("Successfully connected to clinical_trials collection")
-            except Exception as e:
-                print(f"Error accessing collection: {e}")
-                print("Creating new collection...")
-                self.collection = self.client.create_collection(
-                    name="clinical_trials",
-                    metadata={"description": "Clinical trials database"}
-                )
+        # The Chroma client, prompt and LLM are built on a background thread so
+        # callers (e.g. a Streamlit page) can render meanwhile; first use waits.
+        # One thread: concurrent imports of overlapping packages are not safe
+        self._startup = {}
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assistant-startup")
+        self._startup["store"] = executor.submit(self._connect, persist_directory)
+        self._startup["prompt"] = executor.submit(self._load_prompt)
+        if llm is None:
+            self._startup["llm"] = executor.submit(get_llm, self.model_name)
         else:
+            self.llm = llm
+        executor.shutdown(wait=False)
+        if not background:
+            self.wait_until_ready()
+    
+    def _connect(self, persist_directory: str):
+        """Open the Chroma collection and load the query embedding model."""
+        if not CHROMADB_AVAILABLE:
             print("ChromaDB not available, using simple search")
-            self.client = None
-            self.collection = None
+            return None, None, None
+        # Same model the indexer embeds documents with
+        embedding_function = get_embedding_function()
+        client = get_chroma_client(persist_directory)
         
-        self.prompt_template = PromptTemplate(
-            input_variables=["context", "question", "nct_ids"],
-            template="""You are a helpful clinical trial assistant. Use the following context about clinical trials to answer the question. Be concise and focus on the most relevant trials.
-            
-Context about clinical trials:
-{context}
-
-Question: {question}
-
-Instructions:
-1. If the context doesn't contain enough information to answer the question confidently, respond with "I don't have enough information to answer this question accurately."
-2. When answering, include key information such as trial status, phase, and dates when relevant.
-3. Never make assumptions about medical information that isn't explicitly stated in the context.
-4. End your response with "Sources: " followed by the trial IDs [{nct_ids}].
-
-Answer: """
-        )
+        # List all collections
+        collections = client.list_collections()
+        print(f"Available collections: {[c.name for c in collections]}")
+        
+        try:
+            collection = client.get_collection("clinical_trials")
+            print("Successfully connected to clinical_trials collection")
+        except Exception as e:
+            print(f"Error accessing collection: {e}")
+            print("Creating new collection...")
+            collection = client.create_collection(
+                name="clinical_trials",
+                metadata={"description": "Clinical trials database"}
+            )
+        
+        # Load the embedding model now rather than on the first question
+        embedding_function(["clinical trial"])
+        return embedding_function, client, collection
+    
+    def _load_prompt(self):
+        from langchain.prompts import PromptTemplate
+        
+        return PromptTemplate(input_variables=["context", "question", "nct_ids"], template=PROMPT_TEMPLATE)
+    
+    def _resource(self, name: str):
+        """Wait for a startup task; re-raises its error."""
+        return self._startup[name].result()
+    
+    @property
+    def embedding_function(self):
+        return self._resource("store")[0]
+    
+    @property
+    def client(self):
+        return self._resource("store")[1]
+    
+    @property
+    def collection(self):
+        return self._resource("store")[2]
+    
+    @property
+    def prompt_template(self):
+        return self._resource("prompt")
+    
+    @property
+    def llm(self):
+        return self._resource("llm")
+    
+    @llm.setter
+    def llm(self, llm):
+        future = Future()
+        future.set_result(llm)
+        self._startup["llm"] = future
+    
+    def ready(self) -> bool:
+        """True once the Chroma client, LLM and prompt have been created."""
+        return all(future.done() for future in self._startup.values())
+    
+    def wait_until_ready(self, timeout: Optional[float] = None):
+        """Block until startup finishes; raises any startup error."""
+        for future in list(self._startup.values()):
+            future.result(timeout=timeout)
+    
+    def _wait_for_startup(self, timings: Dict):
+        """Wait for background startup, timed as the ``startup`` stage when it was still running."""
+        if not self.ready():
+            # Only the first queries wait; kept out of the other stages
+            with self.tracer.span("startup", timings):
+                self.wait_until_ready()
+    
+    def query(self, question: str, n_results: int = 3, filters: Optional[Dict] = None) -> Dict:
+        """Query the clinical trials database and generate a response.
         
-    def query(self, question: str, n_results: int = 3) -> Dict:
-        """Query the clinical trials database and generate a response."""
+        ``filters`` restricts retrieval by phase, status, purpose, start date
+        or condition, e.g. ``{"phase": "Phase 3", "status": "Recruiting"}``.
+        """
+        return self.query_batch([question], n_results=n_results, filters=filters)[0]
+    
+    def query_batch(self, questions: List[str], n_results: int = 3, max_concurrency: int = 4,
+                    filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Answer many questions at once; results match calling ``query`` for each.
+        
+        Uncached questions are embedded as one batch and retrieved with one
+        Chroma query per distinct filter set, and their prompts are sent to
+        the LLM with up to ``max_concurrency`` calls in flight. Repeated
+        questions are answered once.
+        """
+        started = time.perf_counter()
+        timings = {}
+        self._wait_for_startup(timings)
         if not self.collection:
             # Fallback to simple response if ChromaDB not available
-            return {
+            return [{
                 "answer": "I'm running in simplified mode. ChromaDB is not available for detailed trial search. Please use the Simple Assistant for basic functionality.",
                 "sources": [],
                 "context": "No vector database available"
+            } for _ in questions]
+        
+        # Answer each distinct question once
+        positions = {}
+        unique_questions = []
+        for question in questions:
+            key = self._key(question, n_results, filters)
+            if key not in positions:
+                positions[key] = len(unique_questions)
+                unique_questions.append(question)
+        
+        prepared = self._prepare(unique_questions, n_results, filters, timings)
+        pending = [item for item in prepared if "result" not in item]
+        if len(pending) > 1 and max_concurrency > 1:
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(pending))) as pool:
+                responses = list(pool.map(self._generate_item, pending))
+        else:
+            responses = [self._generate_item(item) for item in pending]
+        for item, (response, ok) in zip(pending, responses):
+            item["result"] = self._finish(item, response, ok)
+        total_ms = (time.perf_counter() - started) * 1000
+        self.tracer.record("total", total_ms)
+        
+        results = []
+        for question in questions:
+            item = prepared[positions[self._key(question, n_results, filters)]]
+            result = dict(item["result"])
+            if self.return_timings:
+                result["timings"] = {**item["timings"], "total": total_ms}
+            results.append(result)
+        return results
+
+    def retrieve(self, questions: List[str], n_results: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Ranked hits (``ids``, ``documents``, ``metadatas``) for each question, best first.
+
+        Runs the same retrieval as ``query`` (filters, hybrid fusion,
+        duplicate collapsing, reranking) without the caches or the LLM, so
+        evaluations measure retrieval itself.
+        """
+        self._check_index()
+        self.wait_until_ready()
+        with self.tracer.span("embed"):
+            embeddings = self._embed(questions)
+        with self.tracer.span("retrieve"):
+            return self._retrieve_filtered(questions, embeddings, n_results, filters)
+
+    def query_stream(self, question: str, n_results: int = 3, filters: Optional[Dict] = None) -> Dict:
+        """
+        Query with the answer streamed token by token.
+        
+        Retrieval happens before this returns, so ``sources`` and ``nct_ids``
+        are available before the first token; ``answer_stream`` yields the
+        answer text as the LLM generates it. Cached answers are yielded whole.
+        The result has the same keys as ``query`` plus ``answer_stream``; for
+        a fresh answer ``answer`` is None until the stream has been consumed.
+        """
+        timings = {}
+        self._wait_for_startup(timings)
+        if not self.collection:
+            result = self.query(question, n_results, filters)
+            result["answer_stream"] = iter([result["answer"]])
+            return result
+        
+        item = self._prepare([question], n_results, filters, timings)[0]
+        if "result" in item:
+            result = dict(item["result"])
+            result["answer_stream"] = iter([result["answer"]])
+        else:
+            result = {
+                "answer": None,
+                "sources": item["sources"],
+                "nct_ids": item["nct_ids"]
             }
-            
-        # Get relevant documents
-        results = self.collection.query(
-            query_texts=[question],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
-        )
+            result["answer_stream"] = self._stream_answer(item, result)
+        if self.return_timings:
+            # LLM stages are added as the stream is consumed
+            result["timings"] = item["timings"]
+        return result
+    
+    def _stream_answer(self, item: Dict, result: Dict) -> Iterator[str]:
+        """Yield answer tokens for a prepared question; the full answer goes to ``result`` and the cache."""
+        if not hasattr(self.llm, "stream"):
+            response, ok = self._generate_item(item)
+            result["answer"] = response
+            yield response
+            self._finish(item, response, ok)
+            return
         
-        # Sort results by relevance score
-        sorted_indices = sorted(range(len(results["distances"][0])), 
-                              key=lambda i: results["distances"][0][i])
+        chunks = []
+        started = time.perf_counter()
+        try:
+            for chunk in self.llm.stream(item["prompt"], temperature=0.7, timeout=10):
+                token = getattr(chunk, "content", chunk)
+                if not chunks:
+                    self.tracer.record("llm_first_token", (time.perf_counter() - started) * 1000, item["timings"])
+                chunks.append(token)
+                yield token
+        except Exception as e:
+            print(f"Model response timeout: {e}")
+            # Only apologize for an answer that never started; a partial one is marked as cut off
+            error = STREAM_INTERRUPTED if chunks else \
+                "I apologize, but I'm taking too long to process this request. Could you try rephrasing your question?"
+            result["answer"] = "".join(chunks) + error
+            yield error
+            return
+        # Includes time the consumer spent between tokens
+        self.tracer.record("llm", (time.perf_counter() - started) * 1000, item["timings"])
+        result["answer"] = "".join(chunks)
+        self._finish(item, result["answer"], True)
+    
+    async def aquery(self, question: str, n_results: int = 3, filters: Optional[Dict] = None) -> Dict:
+        """
+        Asyncio-native ``query`` that never blocks the event loop.
+        
+        Cache lookup, embedding and the Chroma search (which has no async
+        client) run in the default thread pool; the LLM call uses the
+        backend's async client when it has one and a worker thread otherwise.
+        Cancelling the task abandons the request, and many calls can be
+        fanned out from one process with ``asyncio.gather``.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        timings = {}
+        # ``collection`` waits for background startup, so wait off the event loop first
+        await loop.run_in_executor(None, self._wait_for_startup, timings)
+        if not self.collection:
+            return self.query(question, n_results, filters)
+        
+        prepared = await loop.run_in_executor(None, partial(self._prepare, [question], n_results, filters, timings))
+        item = prepared[0]
+        if "result" in item:
+            result = dict(item["result"])
+        else:
+            with self.tracer.span("llm", item["timings"]):
+                response, ok = await self._agenerate(item["prompt"])
+            result = dict(self._finish(item, response, ok))
+        total_ms = (time.perf_counter() - started) * 1000
+        self.tracer.record("total", total_ms)
+        if self.return_timings:
+            result["timings"] = {**item["timings"], "total": total_ms}
+        return result
+    
+    def _prepare(self, questions: List[str], n_results: int, filters: Optional[Dict] = None,
+                 timings: Optional[Dict] = None) -> List[Dict]:
+        """
+        Resolve cached answers and build prompts for the rest, in batch.
+        
+        Each returned item holds either a finished ``result`` or the ``key``,
+        ``embedding``, ``prompt``, ``sources`` and ``nct_ids`` needed to
+        generate and cache one. Stage timings are added to ``timings``.
+        """
+        timings = {} if timings is None else timings
+        self._wait_for_startup(timings)
+        self._check_index()
+        prepared = [{"key": self._key(question, n_results, filters), "timings": timings} for question in questions]
+        
+        misses = []
+        for i, item in enumerate(prepared):
+            cached = self.cache.answers.get(item["key"])
+            if cached is not None:
+                item["result"] = cached
+            else:
+                misses.append(i)
+        if not misses:
+            return prepared
         
+        # The query embedding serves both the semantic cache and retrieval
+        with self.tracer.span("embed", timings):
+            embeddings = self._embed([questions[i] for i in misses])
+        to_retrieve = []
+        for i, embedding in zip(misses, embeddings):
+            item = prepared[i]
+            item["embedding"] = embedding
+            if self.cache.semantic is not None:
+                cached = self.cache.semantic.get(embedding, item["key"][1:])
+                if cached is not None:
+                    self.cache.answers.put(item["key"], cached)
+                    item["result"] = cached
+                    continue
+            # Get relevant documents
+            item["results"] = self.cache.retrievals.get(item["key"])
+            if item["results"] is None:
+                to_retrieve.append(i)
+        
+        if to_retrieve:
+            with self.tracer.span("retrieve", timings):
+                retrieved = self._retrieve_filtered([questions[i] for i in to_retrieve],
+                                                    [prepared[i]["embedding"] for i in to_retrieve],
+                                                    n_results, filters, timings)
+            for i, results in zip(to_retrieve, retrieved):
+                prepared[i]["results"] = results
+                self.cache.retrievals.put(prepared[i]["key"], results)
+        
+        with self.tracer.span("context", timings):
+            for question, item in zip(questions, prepared):
+                if "result" not in item:
+                    item["prompt"], item["sources"], item["nct_ids"] = \
+                        self._build_prompt(question, item.pop("results"))
+        # Batch stages are shared; each question adds its own LLM time to a copy
+        for item in prepared:
+            item["timings"] = dict(timings)
+        return prepared
+    
+    def _finish(self, item: Dict, response: str, ok: bool) -> Dict:
+        """Assemble the response dict for a prepared question and cache it."""
+        result = {
+            "answer": response,
+            "sources": item["sources"],
+            "nct_ids": item["nct_ids"]
+        }
+        # Fallback apologies are not worth repeating from cache
+        if ok:
+            self.cache.answers.put(item["key"], result)
+            if self.cache.semantic is not None:
+                self.cache.semantic.put(item["embedding"], item["key"][1:], result)
+        return result
+    
+    def _effective_filters(self, question: str, filters: Optional[Dict]) -> Dict:
+        """Filters parsed from the question (if enabled), overridden by explicit ones."""
+        effective = parse_filters(question) if self.auto_filters else {}
+        effective.update(filters or {})
+        return effective
+    
+    def _key(self, question: str, n_results: int, filters: Optional[Dict]) -> tuple:
+        """Cache key; includes the effective filters so the semantic cache never crosses them."""
+        return self.cache.key(question, n_results,
+                              filters=filters_key(self._effective_filters(question, filters)))
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters and sizes of the retrieval and answer caches."""
+        return self.cache.stats()
+    
+    def latency_stats(self) -> Dict[str, Dict]:
+        """Per-stage latency summaries (count, mean, p50/p95/p99, max in ms)."""
+        return self.tracer.stats()
+    
+    def rerank_stats(self) -> Dict:
+        """How many retrievals were reranked or skipped for the latency budget."""
+        return self.rerank_stage.stats() if self.rerank_stage else {}
+    
+    def _check_index(self):
+        """Reload side indexes and drop caches when the index was rebuilt."""
+        version = self._index_version()
+        if version != self._bm25_version:
+            self.bm25 = BM25Index.load(self.bm25_path) if self.hybrid else None
+            self.quantized = QuantizedIndex.load(self.quantized_path, self.embedding_cache_path) \
+                if self.vector_index == "quantized" else None
+            if self.vector_index == "quantized" and self.quantized is None:
+                print(f"Warning: no quantized index at {self.quantized_path}; searching Chroma instead")
+            self._bm25_version = version
+        self.cache.check_index_version(version)
+    
+    def _index_version(self):
+        """Identify the current index build by its manifest file."""
+        try:
+            stat = self.manifest_path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _embed(self, texts: List[str]) -> List:
+        """Embed query texts with the index's embedding model."""
+        return self.embedding_function(texts)
+    
+    def _retrieve_filtered(self, questions: List[str], query_embeddings: List, n_results: int,
+                           filters: Optional[Dict] = None, timings: Optional[Dict] = None) -> List[Dict]:
+        """Retrieve with each question's effective filters, one Chroma query per distinct set.
+        
+        Questions whose parsed filters match nothing are retried with only
+        the explicit filters, so a misread question still gets an answer.
+        """
+        effective = [self._effective_filters(question, filters) for question in questions]
+        hits = [None] * len(questions)
+        for attempt in (effective, [filters or {}] * len(questions)):
+            groups = {}
+            for i, question_filters in enumerate(attempt):
+                if hits[i] is None or (not hits[i]["ids"] and question_filters != effective[i]):
+                    groups.setdefault(filters_key(question_filters), (question_filters, []))[1].append(i)
+            for question_filters, group in groups.values():
+                retrieved = self._retrieve_many([questions[i] for i in group],
+                                                [query_embeddings[i] for i in group],
+                                                n_results, question_filters, timings)
+                for i, results in zip(group, retrieved):
+                    hits[i] = results
+        return hits
+    
+    def _retrieve_many(self, questions: List[str], query_embeddings: List, n_results: int,
+                       filters: Optional[Dict] = None, timings: Optional[Dict] = None) -> List[Dict]:
+        """Run one Chroma query for a batch of questions; hits best first.
+        
+        ``filters`` are evaluated by Chroma before the nearest-neighbour
+        search. When a BM25 index is loaded, both retrievers over-fetch and
+        their rankings are fused by reciprocal rank fusion. Near-duplicates
+        are collapsed to their best hit. With a reranker,
+        ``rerank_candidates`` hits are fetched and rescored per question.
+        """
+        started = time.perf_counter()
+        bm25 = self.bm25
+        stage = self.rerank_stage
+        if stage is not None:
+            fetch_k = max(stage.candidates, n_results)
+        else:
+            over_fetch = bm25 is not None or self.collapse_duplicates
+            fetch_k = max(2 * n_results, 10) if over_fetch else n_results
+        where, where_document = build_where(filters)
+        with self.tracer.span("vector_search", timings):
+            if self.quantized is not None:
+                results = self._quantized_query(query_embeddings, fetch_k, where, where_document)
+            else:
+                results = self.collection.query(
+                    query_embeddings=[[float(x) for x in embedding] for embedding in query_embeddings],
+                    n_results=fetch_k,
+                    where=where,
+                    where_document=where_document,
+                    include=["documents", "metadatas", "distances"]
+                )
+        
+        hits = []
+        for q, question in enumerate(questions):
+            # Sort results by relevance score
+            order = sorted(range(len(results["distances"][q])), 
+                           key=lambda i: results["distances"][q][i])
+            vector_hits = {
+                "ids": [results["ids"][q][i] for i in order],
+                "documents": [results["documents"][q][i] for i in order],
+                "metadatas": [results["metadatas"][q][i] for i in order],
+                "distances": [results["distances"][q][i] for i in order]
+            }
+            if bm25 is not None:
+                with self.tracer.span("bm25", timings):
+                    keyword_ids = [trial_id for trial_id, _ in bm25.search(question, fetch_k)]
+                    if keyword_ids and (where or where_document):
+                        keyword_ids = self._matching_ids(keyword_ids, where, where_document)
+                    vector_hits = self._fuse(question, vector_hits, keyword_ids, fetch_k)
+            if self.collapse_duplicates:
+                vector_hits = collapse_duplicates(vector_hits)
+            if stage is not None:
+                with self.tracer.span("rerank", timings):
+                    vector_hits = stage.rerank(question, vector_hits, n_results, started)
+            else:
+                vector_hits = select_hits(vector_hits, range(min(n_results, len(vector_hits["ids"]))))
+            hits.append(vector_hits)
+        return hits
+    
+    def _quantized_query(self, query_embeddings: List, n_results: int, where: Optional[Dict],
+                         where_document: Optional[Dict]) -> Dict:
+        """Nearest neighbours from the quantized index, shaped like a Chroma query result."""
+        quantized = self.quantized
+        allowed_rows = None
+        if where or where_document:
+            allowed = self.collection.get(where=where, where_document=where_document, include=[])["ids"]
+            allowed_rows = quantized.rows_for(allowed)
+        neighbours = [quantized.search(embedding, n_results, allowed_rows, self.rescore_candidates)
+                      for embedding in query_embeddings]
+        
+        wanted = list({trial_id for found in neighbours for trial_id, _ in found})
+        fetched = self.collection.get(ids=wanted, include=["documents", "metadatas"]) if wanted else {"ids": []}
+        found = {trial_id: (document, metadata) for trial_id, document, metadata
+                 in zip(fetched["ids"], fetched.get("documents") or [], fetched.get("metadatas") or [])}
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for pairs in neighbours:
+            pairs = [(trial_id, distance) for trial_id, distance in pairs if trial_id in found]
+            results["ids"].append([trial_id for trial_id, _ in pairs])
+            results["documents"].append([found[trial_id][0] for trial_id, _ in pairs])
+            results["metadatas"].append([found[trial_id][1] for trial_id, _ in pairs])
+            results["distances"].append([distance for _, distance in pairs])
+        return results
+    
+    def _matching_ids(self, ids: List[str], where: Optional[Dict], where_document: Optional[Dict]) -> List[str]:
+        """Keep the ids (in order) whose trials satisfy the filters."""
+        matching = set(self.collection.get(ids=ids, where=where, where_document=where_document, include=[])["ids"])
+        return [trial_id for trial_id in ids if trial_id in matching]
+    
+    def _fuse(self, question: str, vector_hits: Dict, keyword_ids: List[str], n_results: int) -> Dict:
+        """Reciprocal-rank-fuse vector hits with BM25 ids, fetching keyword-only trials."""
+        # Trials the question names by NCT number go first
+        exact_ids = mentioned_ids(question, keyword_ids)
+        fused = reciprocal_rank_fusion([vector_hits["ids"], keyword_ids], exact_ids=exact_ids)[:n_results]
+        found = {trial_id: (document, metadata) for trial_id, document, metadata
+                 in zip(vector_hits["ids"], vector_hits["documents"], vector_hits["metadatas"])}
+        missing = [trial_id for trial_id, _ in fused if trial_id not in found]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            found.update(zip(fetched["ids"], zip(fetched["documents"], fetched["metadatas"])))
+        
+        fused = [(trial_id, score) for trial_id, score in fused if trial_id in found]
+        return {
+            "ids": [trial_id for trial_id, _ in fused],
+            "documents": [found[trial_id][0] for trial_id, _ in fused],
+            "metadatas": [found[trial_id][1] for trial_id, _ in fused],
+            "scores": [score for _, score in fused]
+        }
+    
+    def _build_prompt(self, question: str, results: Dict):
+        """Assemble the LLM prompt from retrieved hits; returns (prompt, sources, nct_ids)."""
         # Take only the most relevant parts of each document
         contexts = []
         metadata_list = []
-        for idx in sorted_indices[:2]:  # Use only top 2 most relevant results
-            doc = results["documents"][0][idx]
+        for doc, metadata in zip(results["documents"][:self.context_k], results["metadatas"][:self.context_k]):
             # Extract just the title and first 100 characters of description
             if "\n\n" in doc:
                 title, desc = doc.split("\n\n", 1)
@@ -133,7 +712,7 @@ Answer: """
             else:
                 context = doc[:150] + "..."
             contexts.append(context)
-            metadata_list.append(results["metadatas"][0][idx])
+            metadata_list.append(metadata)
         
         context = "\n---\n".join(contexts)
         
@@ -144,21 +723,35 @@ Answer: """
                 nct_ids.append(metadata["nct_id"])
         nct_ids_str = ", ".join(nct_ids) if nct_ids else "No trial IDs available"
         
-        # Generate response using Ollama with timeout
         prompt = self.prompt_template.format(
             context=context,
             question=question,
             nct_ids=nct_ids_str
         )
-        
+        return prompt, metadata_list, nct_ids
+    
+    async def _agenerate(self, prompt: str):
+        """Async counterpart of ``_generate`` with the same timeout and fallback."""
+        if not hasattr(self.llm, "ainvoke"):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._generate, prompt)
         try:
-            response = self.llm(prompt, temperature=0.7, timeout=10)  # 10 second timeout
+            response = await asyncio.wait_for(self.llm.ainvoke(prompt, temperature=0.7), timeout=10)  # 10 second timeout
+            return response, True
         except Exception as e:
             print(f"Model response timeout: {e}")
-            response = "I apologize, but I'm taking too long to process this request. Could you try rephrasing your question?"
-        
-        return {
-            "answer": response,
-            "sources": metadata_list,
-            "nct_ids": nct_ids
-        }
+            return "I apologize, but I'm taking too long to process this request. Could you try rephrasing your question?", False
+    
+    def _generate_item(self, item: Dict):
+        """``_generate`` for a prepared question, timed into its timings."""
+        with self.tracer.span("llm", item["timings"]):
+            return self._generate(item["prompt"])
+    
+    def _generate(self, prompt: str):
+        """Call the LLM; returns (answer, ok) where ok is False for the timeout fallback."""
+        # Generate response using Ollama with timeout
+        try:
+            return self.llm(prompt, temperature=0.7, timeout=10), True  # 10 second timeout
+        except Exception as e:
+            print(f"Model response timeout: {e}")
+            return "I apologize, but I'm taking too long to process this request. Could you try rephrasing your question?", False
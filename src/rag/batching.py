@@ -0,0 +1,156 @@
+"""Micro-batching of concurrent queries into ``query_batch`` calls.
+
+Requests that arrive within ``max_wait_ms`` of the first waiting one (up to
+``max_batch_size``) are answered together: questions with the same
+``n_results`` and filters go to one ``assistant.query_batch`` call, which
+embeds them as one batch and retrieves them with one Chroma query. Batches
+run on ``workers`` threads, so a batch waiting on the LLM does not hold up
+the next one.
+
+At most ``max_pending`` requests are queued or running at once; beyond that
+``submit`` raises ``QueueFullError`` so callers can shed load. Requests
+whose caller stopped waiting (timed out or cancelled) are dropped before
+their batch runs.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+import queue
+import threading
+import time
+
+from .filters import filters_key
+
+
+class QueueFullError(RuntimeError):
+    """Raised by ``MicroBatcher.submit`` when ``max_pending`` requests are already waiting."""
+
+
+class MicroBatcher:
+    """Collects queries from many threads and dispatches them in batches."""
+
+    def __init__(self, assistant, max_batch_size: int = 32, max_wait_ms: float = 5, workers: int = 4,
+                 max_pending: int = 256):
+        self.assistant = assistant
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_pending = max_pending
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self.expired = 0
+        self._pending = 0
+        self._requests = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-batch")
+        self._lock = threading.Lock()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="micro-batcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, question: str, n_results: int = 3, filters: Optional[Dict] = None,
+               timeout: Optional[float] = None) -> Future:
+        """
+        Queue a question; the future resolves to the same result as ``assistant.query``.
+
+        A request still queued ``timeout`` seconds from now is dropped with a
+        ``TimeoutError`` instead of being answered.
+        """
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f"{self._pending} queries are already waiting; try again shortly")
+            self._pending += 1
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self._requests.put((question, n_results, filters, future, deadline))
+        return future
+
+    def query(self, question: str, n_results: int = 3, filters: Optional[Dict] = None,
+              timeout: Optional[float] = None) -> Dict:
+        future = self.submit(question, n_results, filters, timeout=timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()  # skipped by the batch if it has not started yet
+            raise TimeoutError("Timed out waiting for an answer") from None
+
+    def _dispatch(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._requests.put(None)  # stop after this batch
+                    break
+                batch.append(request)
+
+            groups = {}
+            for request in batch:
+                _, n_results, filters, _, _ = request
+                groups.setdefault((n_results, filters_key(filters)), []).append(request)
+            with self._lock:
+                self.batches += len(groups)
+                self.requests += len(batch)
+            for group in groups.values():
+                self._executor.submit(self._run, group)
+
+    def _run(self, group: List):
+        # Drop requests whose caller has given up while they were queued
+        now = time.monotonic()
+        live = []
+        for request in group:
+            _, _, _, future, deadline = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            if deadline is not None and now > deadline:
+                future.set_exception(TimeoutError("Timed out waiting in the query queue"))
+            else:
+                live.append(request)
+        with self._lock:
+            self.expired += len(group) - len(live)
+        try:
+            if not live:
+                return
+            _, n_results, filters, _, _ = live[0]
+            try:
+                results = self.assistant.query_batch([question for question, _, _, _, _ in live],
+                                                     n_results=n_results, filters=filters)
+            except BaseException as e:
+                for _, _, _, future, _ in live:
+                    future.set_exception(e)
+                return
+            for (_, _, _, future, _), result in zip(live, results):
+                future.set_result(result)
+        finally:
+            with self._lock:
+                self._pending -= len(group)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "queued": self._requests.qsize(),
+                "pending": self._pending,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
+    def close(self):
+        """Answer queued requests, then stop the dispatcher and workers."""
+        self._closed = True
+        self._requests.put(None)
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
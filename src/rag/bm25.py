@@ -0,0 +1,173 @@
+"""BM25 inverted index over trial documents, stored as memory-mapped NumPy arrays.
+
+The index is built at index time next to the Chroma store and fused with
+vector search results by reciprocal rank fusion. On disk it is a directory of
+``.npy`` files: a sorted vocabulary, CSR-style postings (document numbers and
+term frequencies per term) and per-document lengths and ids. Loading maps the
+files instead of reading them, so startup cost does not grow with corpus size.
+"""
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import math
+import os
+import re
+import shutil
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case alphanumeric tokens; keeps NCT numbers, doses and phase digits."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def bm25_path(persist_directory: str) -> Path:
+    """Return the BM25 index location for a Chroma persist directory."""
+    persist_path = Path(persist_directory)
+    return persist_path.parent / f"{persist_path.name}_bm25"
+
+
+class BM25Builder:
+    """Accumulates postings batch by batch and writes the on-disk index."""
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {}
+        self._terms = array("I")
+        self._docs = array("I")
+        self._tfs = array("H")
+        self._lengths = array("I")
+        self._ids: List[str] = []
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Optional[Sequence[Dict]] = None):
+        """Add a batch of documents. The trial id is indexed as a token too."""
+        for trial_id, document in zip(ids, documents):
+            doc_no = len(self._ids)
+            tokens = tokenize(f"{trial_id} {document}")
+            for term, tf in Counter(tokens).items():
+                self._terms.append(self._vocab.setdefault(term, len(self._vocab)))
+                self._docs.append(doc_no)
+                self._tfs.append(min(tf, 65535))
+            self._lengths.append(len(tokens))
+            self._ids.append(trial_id)
+
+    def save(self, directory: Path):
+        """Write the index, replacing any previous one as a whole."""
+        directory = Path(directory)
+        terms = np.frombuffer(self._terms, dtype=np.uint32)
+        vocab = np.array(sorted(self._vocab, key=self._vocab.get), dtype=str)
+
+        # Renumber terms alphabetically so queries can binary-search the vocabulary
+        alphabetical = np.argsort(vocab)
+        rank = np.empty_like(alphabetical)
+        rank[alphabetical] = np.arange(len(alphabetical))
+        terms = rank[terms] if len(terms) else terms
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+
+        tmp_directory = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        tmp_directory.mkdir(parents=True)
+        np.save(tmp_directory / "vocab.npy", vocab[alphabetical])
+        np.save(tmp_directory / "offsets.npy", offsets)
+        np.save(tmp_directory / "doc_numbers.npy", np.frombuffer(self._docs, dtype=np.uint32)[order])
+        np.save(tmp_directory / "term_freqs.npy", np.frombuffer(self._tfs, dtype=np.uint16)[order])
+        np.save(tmp_directory / "doc_lengths.npy", np.frombuffer(self._lengths, dtype=np.uint32))
+        np.save(tmp_directory / "ids.npy", np.array(self._ids, dtype=str))
+        with open(tmp_directory / "meta.json", "w") as f:
+            json.dump({"documents": len(self._ids), "terms": len(vocab)}, f)
+        _swap_directory(tmp_directory, directory)
+
+
+class BM25Index:
+    """Read-only BM25 index over memory-mapped postings."""
+
+    def __init__(self, directory: Path, k1: float = 1.5, b: float = 0.75):
+        directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self.vocab = np.load(directory / "vocab.npy", mmap_mode="r")
+        self.offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+        self.doc_numbers = np.load(directory / "doc_numbers.npy", mmap_mode="r")
+        self.term_freqs = np.load(directory / "term_freqs.npy", mmap_mode="r")
+        self.doc_lengths = np.load(directory / "doc_lengths.npy", mmap_mode="r")
+        self.ids = np.load(directory / "ids.npy", mmap_mode="r")
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["BM25Index"]:
+        """Open the index, or return None if it has not been built."""
+        if not (Path(directory) / "meta.json").exists():
+            return None
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (trial id, score) pairs, best first."""
+        terms = np.array(sorted(set(tokenize(query))), dtype=str)
+        if not len(terms) or not len(self.vocab) or top_k <= 0:
+            return []
+        positions = np.searchsorted(self.vocab, terms)
+        found = positions < len(self.vocab)
+        found[found] = self.vocab[positions[found]] == terms[found]
+        positions = positions[found]
+
+        n_docs = len(self.ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for position in positions:
+            start, end = self.offsets[position], self.offsets[position + 1]
+            docs = self.doc_numbers[start:end]
+            tfs = self.term_freqs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[docs] / self.avg_length)
+            # Each document appears once per term, so fancy-index addition is safe
+            scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        top_k = min(top_k, n_docs)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def mentioned_ids(query: str, ids: Iterable[str]) -> List[str]:
+    """The ids (e.g. NCT numbers) that appear verbatim as a token of ``query``; plain row numbers never do."""
+    tokens = set(tokenize(query))
+    return [trial_id for trial_id in ids if not trial_id.isdigit() and trial_id.lower() in tokens]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60,
+                           exact_ids: Iterable[str] = ()) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists: score(id) = sum of 1 / (k + rank). Best first.
+
+    Ties go to the later ranking (the keyword ranking, as the assistant
+    passes them), and ``exact_ids`` (ids the query names outright) are
+    placed ahead of everything else.
+    """
+    rankings = list(rankings)
+    scores: Dict[str, float] = {}
+    # The sort is stable, so insertion order decides ties: later rankings first
+    for ranking in reversed(rankings):
+        for rank, trial_id in enumerate(ranking, 1):
+            scores[trial_id] = scores.get(trial_id, 0.0) + 1.0 / (k + rank)
+    for trial_id in exact_ids:
+        if trial_id in scores:
+            scores[trial_id] += len(rankings) / (k + 1)  # more than any id can get from ranks alone
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _swap_directory(new_directory: Path, directory: Path):
+    """Replace ``directory`` with ``new_directory`` with only a brief gap."""
+    old_directory = directory.with_name(directory.name + ".old")
+    shutil.rmtree(old_directory, ignore_errors=True)
+    if directory.exists():
+        os.replace(directory, old_directory)
+    os.replace(new_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
@@ -0,0 +1,191 @@
+"""In-process caches for retrieval results and generated answers."""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import re
+import threading
+import time
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Normalize question text for cache keys (case, whitespace, trailing punctuation)."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a size bound, per-entry TTL and hit/miss counters.
+
+    ``ttl=None`` keeps entries until they are evicted; ``ttl <= 0`` expires
+    them immediately, i.e. nothing is cached.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        if self.maxsize <= 0 or (self.ttl is not None and self.ttl <= 0):
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class SemanticCache:
+    """
+    Answer cache for near-duplicate questions, matched by embedding similarity.
+
+    Embeddings of recently answered questions live in a fixed-size,
+    L2-normalized matrix (a ring buffer of ``capacity`` rows), so a lookup is
+    one matrix-vector product. At this size exact search is cheaper than
+    maintaining an approximate index. A hit requires cosine similarity of at
+    least ``threshold`` and identical retrieval options.
+    """
+
+    def __init__(self, capacity: int = 512, threshold: float = 0.92, ttl: Optional[float] = 3600):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._entries = [None] * capacity
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def get(self, embedding, options: Hashable) -> Optional[Any]:
+        """Return the answer of the most similar cached question, if close enough."""
+        query = _normalize(embedding)
+        with self._lock:
+            if self._count:
+                similarities = self._vectors[:self._count] @ query
+                now = time.monotonic()
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                for row in candidates[np.argsort(-similarities[candidates])]:
+                    entry_options, value, expires_at = self._entries[row]
+                    if entry_options == options and (expires_at is None or expires_at > now):
+                        self.hits += 1
+                        return value
+            self.misses += 1
+            return None
+
+    def put(self, embedding, options: Hashable, value: Any):
+        """Remember an answer, overwriting the oldest entry when full."""
+        if self.capacity <= 0 or (self.ttl is not None and self.ttl <= 0):
+            return
+        vector = _normalize(embedding)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.capacity
+                self._count = self._next = 0
+            self._vectors[self._next] = vector
+            self._entries[self._next] = (options, value, expires_at)
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._entries = [None] * self.capacity
+            self._count = self._next = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": self._count,
+                "maxsize": self.capacity,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def _normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class QueryCache:
+    """
+    Two-level query cache: retrieval results and final answers.
+
+    Both levels are keyed on the normalized question plus the retrieval
+    options (``n_results`` and friends), and are dropped together whenever
+    the index version changes. An optional semantic level serves answers
+    for paraphrased questions (``semantic_threshold=None`` disables it).
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = 3600,
+                 semantic_threshold: Optional[float] = 0.92):
+        self.retrievals = LRUCache(maxsize, ttl)
+        self.answers = LRUCache(maxsize, ttl)
+        self.semantic = SemanticCache(maxsize, semantic_threshold, ttl) if semantic_threshold is not None else None
+        self._index_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(question: str, n_results: int, **options) -> tuple:
+        return (normalize_question(question), n_results, tuple(sorted(options.items())))
+
+    def check_index_version(self, index_version: Hashable):
+        """Invalidate both levels if the index changed since the last check."""
+        with self._lock:
+            if index_version == self._index_version:
+                return
+            self._index_version = index_version
+        self.clear()
+
+    def clear(self):
+        self.retrievals.clear()
+        self.answers.clear()
+        if self.semantic is not None:
+            self.semantic.clear()
+
+    def stats(self) -> Dict:
+        stats = {"retrieval": self.retrievals.stats(), "answer": self.answers.stats()}
+        if self.semantic is not None:
+            stats["semantic"] = self.semantic.stats()
+        return stats
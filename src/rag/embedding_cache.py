@@ -0,0 +1,140 @@
+"""On-disk embedding cache keyed by (embedding model, document text hash).
+
+One directory per model holds:
+
+- ``vectors.f32``: float32 rows, appended in place and memory-mapped for reads
+- ``index.npy``: sorted 64-bit text hashes and their row numbers (a 2 x n
+  array), searched with a binary search
+- ``meta.json``: dimension and row count
+
+Readers (indexer workers) see the snapshot that was last saved; the
+indexer's writer appends new rows during a build and ``save`` publishes
+them at the end, so rows written by an interrupted build are simply
+overwritten by the next one.
+"""
+from pathlib import Path
+from typing import Dict, List, Sequence
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+
+def embedding_cache_path(persist_directory: str) -> Path:
+    """Return the embedding cache location for a Chroma persist directory."""
+    persist_path = Path(persist_directory)
+    return persist_path.parent / f"{persist_path.name}_embedding_cache"
+
+
+def text_keys(texts: Sequence[str]) -> np.ndarray:
+    """64-bit keys for texts (the first 8 bytes of their SHA-1)."""
+    return np.array([int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+                     for text in texts], dtype=np.uint64)
+
+
+class EmbeddingCache:
+    """Embedding vectors for one model, looked up by text key."""
+
+    def __init__(self, root: Path, model: str):
+        self.directory = Path(root) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        self.model = model
+        self.hits = 0
+        self._open()
+
+    def current_version(self):
+        """Identify the published state by its metadata file."""
+        try:
+            stat = (self.directory / "meta.json").stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _open(self):
+        self.version = self.current_version()
+        self.dim = None
+        self.count = 0
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.rows = np.zeros(0, dtype=np.uint64)
+        self.vectors = None
+        self._new_keys: List[np.ndarray] = []
+        self._appended = 0
+
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.dim, self.count = meta["dim"], meta["count"]
+        if self.count:
+            index = np.load(self.directory / "index.npy", mmap_mode="r")
+            self.keys, self.rows = index[0], index[1]
+            # Map every row on disk: an index published after ``meta`` was read may reference them
+            vectors_path = self.directory / "vectors.f32"
+            on_disk = vectors_path.stat().st_size // (4 * self.dim)
+            self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(on_disk, self.dim))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Row number for each key, -1 where the key is not cached."""
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.searchsorted(self.keys, keys)
+        positions = np.minimum(positions, len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        return np.where(found, self.rows[positions].astype(np.int64), -1)
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors for row numbers returned by ``lookup`` (all must be found)."""
+        return np.asarray(self.vectors[np.asarray(rows)], dtype=np.float32)
+
+    def append(self, keys: np.ndarray, vectors: np.ndarray):
+        """Write new rows; they become visible to readers after ``save``."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {vectors.shape[1]}")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / "vectors.f32"
+        with open(path, "ab") as f:
+            if not self._appended:
+                # Drop rows left behind by an interrupted build
+                f.truncate(self.count * self.dim * 4)
+            f.write(vectors.tobytes())
+        self._new_keys.append(np.asarray(keys, dtype=np.uint64))
+        self._appended += len(keys)
+
+    def save(self):
+        """
+        Publish appended rows: write the new row count, then the merged key index.
+
+        Each file is replaced atomically, and an index never references rows
+        beyond the published count, so readers always see a consistent cache.
+        """
+        if not self._appended:
+            return
+        new_keys = np.concatenate(self._new_keys)
+        all_keys = np.concatenate([np.asarray(self.keys), new_keys])
+        all_rows = np.concatenate([np.asarray(self.rows),
+                                   np.arange(self.count, self.count + len(new_keys), dtype=np.uint64)])
+        # Existing rows come first, so they win over repeats appended by parallel workers
+        keys, first = np.unique(all_keys, return_index=True)
+
+        tmp_meta = self.directory / "meta.json.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({"model": self.model, "dim": self.dim, "count": self.count + len(new_keys)}, f)
+        os.replace(tmp_meta, self.directory / "meta.json")
+        tmp_index = self.directory / "index.npy.tmp"
+        with open(tmp_index, "wb") as f:
+            np.save(f, np.stack([keys, all_rows[first]]))
+        os.replace(tmp_index, self.directory / "index.npy")
+        self._open()
+
+    def stats(self) -> Dict:
+        return {"model": self.model, "rows": self.count, "dim": self.dim, "hits": self.hits}
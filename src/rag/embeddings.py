@@ -0,0 +1,62 @@
+"""Embedding function used by both the indexer and the assistant.
+
+``EMBEDDING_BACKEND`` selects it:
+
+- ``default``: Chroma's default embedding function (all-MiniLM-L6-v2 via
+  ONNX; downloads the model on first use)
+- ``hash``: a deterministic bag-of-words hashing embedder with no model
+  download, for offline benchmarks and tests; retrieval quality is far
+  below the real model
+
+The backend name is part of the embedding cache key, so vectors from
+different backends never mix.
+"""
+import hashlib
+import os
+import re
+from typing import List, Sequence
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+HASH_DIMENSIONS = 384
+
+
+def embedding_backend() -> str:
+    return os.getenv("EMBEDDING_BACKEND", "default")
+
+
+def embedding_model_name() -> str:
+    """Name that identifies the active embedding model (embedding cache key)."""
+    if embedding_backend() == "hash":
+        return f"hash-{HASH_DIMENSIONS}"
+    return DEFAULT_EMBEDDING_MODEL
+
+
+class HashEmbeddingFunction:
+    """L2-normalized counts of hashed lowercase word tokens."""
+
+    def __init__(self, dimensions: int = HASH_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def __call__(self, input: Sequence[str]) -> List[np.ndarray]:
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for token in re.findall(r"[a-z0-9]+", text.lower()):
+                vector[int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                       % self.dimensions] += 1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+
+def get_embedding_function():
+    """Build the embedding function selected by ``EMBEDDING_BACKEND``."""
+    backend = embedding_backend()
+    if backend == "hash":
+        return HashEmbeddingFunction()
+    if backend != "default":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+    return DefaultEmbeddingFunction()
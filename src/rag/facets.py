@@ -0,0 +1,138 @@
+"""Precomputed facet counts of the whole index, for dashboards and dataset statistics.
+
+Built at index time next to the Chroma store from each trial's metadata and
+stored as one JSON file:
+
+- ``total``: number of indexed trials
+- ``counts``: trials per status, phase, purpose, condition and start month
+  (``YYYY-MM``); a trial counts once for each of its ``|``-separated
+  conditions
+- ``crosstabs``: nested counts for pairs of facets, e.g.
+  ``crosstabs["status_phase"][status][phase]``
+
+Conditions are limited to the ``max_conditions`` most common (and to
+``crosstab_conditions`` in cross-tabs), so the file and anything rendered
+from it stay the same size however many trials are indexed.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+import json
+import os
+
+FACETS = ("status", "phase", "purpose", "condition", "start_month")
+CROSSTABS = (
+    ("status", "phase"),
+    ("status", "purpose"),
+    ("phase", "purpose"),
+    ("start_month", "status"),
+    ("start_month", "phase"),
+    ("condition", "status"),
+    ("condition", "phase"),
+)
+UNKNOWN = "Unknown"
+
+
+def facets_path(persist_directory: str) -> Path:
+    """Return the facet counts location for a Chroma persist directory."""
+    persist_path = Path(persist_directory)
+    return persist_path.parent / f"{persist_path.name}_facets.json"
+
+
+def _label(value) -> str:
+    value = str(value).strip() if value is not None else ""
+    return value if value and value.lower() != "nan" else UNKNOWN
+
+
+def trial_facets(metadata: Dict) -> Dict[str, Sequence[str]]:
+    """Facet values of one trial; every facet has at least one value."""
+    try:
+        start = int(metadata.get("start_date_num") or 0)
+    except ValueError:
+        start = 0
+    conditions = [_label(condition) for condition in str(metadata.get("condition", "")).split("|")]
+    return {
+        "status": [_label(metadata.get("status"))],
+        "phase": [_label(metadata.get("phase"))],
+        "purpose": [_label(metadata.get("purpose"))],
+        "condition": list(dict.fromkeys(conditions)),
+        "start_month": [f"{start // 10000:04d}-{start // 100 % 100:02d}" if start else UNKNOWN],
+    }
+
+
+class FacetBuilder:
+    """Accumulates facet and cross-tab counts batch by batch and writes them."""
+
+    def __init__(self, max_conditions: int = 1000, crosstab_conditions: int = 50):
+        self.max_conditions = max_conditions
+        self.crosstab_conditions = crosstab_conditions
+        self.total = 0
+        self._counts = {facet: Counter() for facet in FACETS}
+        self._crosstabs = {pair: Counter() for pair in CROSSTABS}
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict]):
+        """Count a batch of trials; only the metadata is used."""
+        # Category values repeat heavily, so count each distinct combination once
+        combinations = Counter(
+            tuple(str(metadata.get(key, "")) for key in ("status", "phase", "purpose", "condition", "start_date_num"))
+            for metadata in metadatas
+        )
+        for (status, phase, purpose, condition, start_date_num), n in combinations.items():
+            values = trial_facets({"status": status, "phase": phase, "purpose": purpose,
+                                   "condition": condition, "start_date_num": start_date_num})
+            self.total += n
+            for facet in FACETS:
+                for value in values[facet]:
+                    self._counts[facet][value] += n
+            for row, column in CROSSTABS:
+                crosstab = self._crosstabs[(row, column)]
+                for a in values[row]:
+                    for b in values[column]:
+                        crosstab[(a, b)] += n
+
+    def facets(self) -> Dict:
+        """The counts in the stored layout, most common values first."""
+        counts = {facet: dict(counter.most_common()) for facet, counter in self._counts.items()}
+        counts["start_month"] = dict(sorted(self._counts["start_month"].items()))
+        counts["condition"] = dict(self._counts["condition"].most_common(self.max_conditions))
+        top_conditions = {condition for condition, _ in
+                          self._counts["condition"].most_common(self.crosstab_conditions)}
+
+        crosstabs = {}
+        for (row, column), counter in self._crosstabs.items():
+            table: Dict[str, Dict[str, int]] = {}
+            for (a, b), count in counter.most_common():
+                if row == "condition" and a not in top_conditions:
+                    continue
+                table.setdefault(a, {})[b] = count
+            if row == "start_month":
+                table = dict(sorted(table.items()))
+            crosstabs[f"{row}_{column}"] = table
+        return {
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "total": self.total,
+            "distinct_conditions": len(self._counts["condition"]),
+            "counts": counts,
+            "crosstabs": crosstabs,
+        }
+
+    def save(self, path: Path) -> Dict:
+        """Atomically write the facet counts to ``path``."""
+        facets = self.facets()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(facets, f)
+        os.replace(tmp_path, path)
+        return facets
+
+
+def load_facets(path: Path) -> Optional[Dict]:
+    """Load facet counts, or None if the index was built without them."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,210 @@
+"""Structured trial filters: parsing from question text and Chroma ``where`` clauses.
+
+Filters are a dict with any of these keys:
+    phase            "Phase 3" or a list of phases (any of them matches)
+    status           "Recruiting" or a list of statuses
+    purpose          "Treatment" or a list of primary purposes
+    start_date_from  earliest start date, "2020", "2020-06" or "2020-06-01"
+    start_date_to    latest start date, same formats
+    condition        text the trial's conditions must contain (case-insensitive
+                     substring of the document's "Conditions:" line)
+
+They are evaluated by Chroma before the nearest-neighbour search, against the
+normalized metadata the indexer stores next to the display fields.
+"""
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import json
+import re
+
+FILTER_KEYS = ("phase", "status", "purpose", "start_date_from", "start_date_to", "condition")
+# Keys that also accept a list of values
+LIST_FILTER_KEYS = ("phase", "status", "purpose")
+
+# Metadata flag -> pattern matched against the upper-cased, alphanumeric-only Phases value
+PHASE_FLAGS = {
+    "early_phase1": r"EARLYPHASE(?:1|I)(?![IV])",
+    "phase1": r"(?<!EARLY)PHASE(?:1|I)(?![IV])",
+    "phase2": r"PHASE(?:2|II)(?!I)",
+    "phase3": r"PHASE(?:3|III)",
+    "phase4": r"PHASE(?:4|IV)",
+}
+
+# (pattern, status key), most specific first; matched text is consumed
+STATUS_PHRASES = [
+    (r"not yet recruiting", "not_yet_recruiting"),
+    (r"active,? not recruiting", "active_not_recruiting"),
+    (r"(?<!not )recruiting", "recruiting"),
+    ("completed", "completed"),
+    ("terminated", "terminated"),
+    ("withdrawn", "withdrawn"),
+    ("suspended", "suspended"),
+]
+
+ROMAN_NUMERALS = {"i": "1", "ii": "2", "iii": "3", "iv": "4"}
+
+
+def normalize_key(value: str) -> str:
+    """Normalize a category value for matching: ``"Active, not recruiting"`` -> ``"active_not_recruiting"``."""
+    return re.sub(r"[^a-z0-9]+", "_", str(value).lower()).strip("_")
+
+
+def _compact_phase(value) -> str:
+    """``"EARLY_PHASE1"``, ``"Early Phase 1"`` -> ``"EARLYPHASE1"``; separators would defeat the lookbehinds."""
+    return re.sub(r"[^A-Z0-9]", "", str(value).upper())
+
+
+def phase_flag(phase: str) -> Optional[str]:
+    """
+    Map a phase name such as ``"Phase 3"`` or ``"PHASE3"`` to its metadata flag.
+
+    >>> phase_flag("EARLY_PHASE1"), phase_flag("Early Phase 1"), phase_flag("Phase I")
+    ('early_phase1', 'early_phase1', 'phase1')
+    """
+    compact = _compact_phase(phase)
+    for flag, pattern in PHASE_FLAGS.items():
+        if re.fullmatch(pattern, compact):
+            return flag
+    return None
+
+
+def phase_flags_for(phases: str) -> Tuple[bool, ...]:
+    """
+    Which ``PHASE_FLAGS`` a raw Phases value such as ``"PHASE2|PHASE3"`` sets, in order.
+
+    >>> phase_flags_for("EARLY_PHASE1")
+    (True, False, False, False, False)
+    >>> phase_flags_for("Early Phase 1")
+    (True, False, False, False, False)
+    >>> phase_flags_for("PHASE1|PHASE2")
+    (False, True, True, False, False)
+    """
+    compact = _compact_phase(phases)
+    return tuple(bool(re.search(pattern, compact)) for pattern in PHASE_FLAGS.values())
+
+
+def date_number(value, end: bool = False) -> int:
+    """Encode a (partial) date as YYYYMMDD; partial dates expand to the start or ``end`` of the period."""
+    match = re.fullmatch(r"(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?", str(value).strip())
+    if not match:
+        raise ValueError(f"Unrecognized date: {value!r}")
+    year, month, day = match.groups()
+    month = int(month) if month else (12 if end else 1)
+    day = int(day) if day else (31 if end else 1)
+    return int(year) * 10000 + month * 100 + day
+
+
+def _as_list(value) -> List:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def validate_filters(filters) -> Optional[Dict]:
+    """
+    Check filters from an untrusted source, e.g. an HTTP request body.
+
+    Returns them unchanged (None when empty); raises ``ValueError`` for a
+    non-dict, unknown keys, non-string values and dates that do not exist.
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = sorted(set(filters) - set(FILTER_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(map(str, unknown))}")
+    for key, value in filters.items():
+        values = value if key in LIST_FILTER_KEYS and isinstance(value, list) else [value]
+        if not all(item is None or isinstance(item, str) for item in values):
+            raise ValueError(f"Filter {key} must be a string" +
+                             (" or a list of strings" if key in LIST_FILTER_KEYS else ""))
+        if key.startswith("start_date_") and value:
+            date_number(value)
+            parts = [int(part) for part in value.strip().split("-")]
+            try:
+                date(*(parts + [1, 1])[:3])
+            except ValueError:
+                raise ValueError(f"Unrecognized date: {value!r}") from None
+    return filters
+
+
+def build_where(filters: Optional[Dict]) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Translate filters into Chroma ``(where, where_document)`` clauses."""
+    if not filters:
+        return None, None
+
+    clauses = []
+    if filters.get("phase"):
+        flags = sorted({flag for flag in map(phase_flag, _as_list(filters["phase"])) if flag})
+        if flags:
+            phase_clauses = [{flag: True} for flag in flags]
+            clauses.append(phase_clauses[0] if len(phase_clauses) == 1 else {"$or": phase_clauses})
+    for key, field in (("status", "status_key"), ("purpose", "purpose_key")):
+        if filters.get(key):
+            values = sorted({normalize_key(value) for value in _as_list(filters[key])})
+            clauses.append({field: values[0]} if len(values) == 1 else {field: {"$in": values}})
+    if filters.get("start_date_from"):
+        clauses.append({"start_date_num": {"$gte": date_number(filters["start_date_from"])}})
+    if filters.get("start_date_to"):
+        clauses.append({"start_date_num": {"$lte": date_number(filters["start_date_to"], end=True)}})
+
+    where = None
+    if clauses:
+        where = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    where_document = None
+    if filters.get("condition"):
+        # Case-insensitive substring match, limited to the "Conditions:" line of the document
+        condition = re.escape(str(filters["condition"]).strip())
+        where_document = {"$regex": f"(?im)^Conditions: .*{condition}"}
+    return where, where_document
+
+
+def parse_filters(question: str) -> Dict:
+    """
+    Extract the obvious filters from question text.
+
+    Recognizes phases ("phase 3", "phase II", "phase 2/3"), explicit
+    statuses ("recruiting", "completed", ...) and start years ("since 2020",
+    "after 2019", "before 2022", "in 2023", "between 2019 and 2021").
+    """
+    text = question.lower()
+    filters = {}
+
+    phases = []
+    for match in re.finditer(r"\bphase\s*(iv|i{1,3}|[1-4])\b(?:\s*[/&-]\s*(iv|i{1,3}|[1-4])\b)?", text):
+        for number in match.groups():
+            if number:
+                phases.append(f"Phase {ROMAN_NUMERALS.get(number, number)}")
+    if phases:
+        filters["phase"] = sorted(set(phases))
+
+    statuses = []
+    remaining = text
+    for phrase, status in STATUS_PHRASES:
+        pattern = rf"\b{phrase}\b"
+        if re.search(pattern, remaining):
+            statuses.append(status)
+            remaining = re.sub(pattern, " ", remaining)
+    if statuses:
+        filters["status"] = statuses
+
+    between = re.search(r"\bbetween\s+(\d{4})\s+and\s+(\d{4})\b", text)
+    if between:
+        filters["start_date_from"], filters["start_date_to"] = between.group(1), between.group(2)
+    else:
+        since = re.search(r"\b(since|from|after)\s+(\d{4})\b", text)
+        if since:
+            year = int(since.group(2)) + (1 if since.group(1) == "after" else 0)
+            filters["start_date_from"] = str(year)
+        before = re.search(r"\bbefore\s+(\d{4})\b", text)
+        if before:
+            filters["start_date_to"] = str(int(before.group(1)) - 1)
+        during = re.search(r"\b(?:in|during)\s+(\d{4})\b", text)
+        if during and not since and not before:
+            filters["start_date_from"] = filters["start_date_to"] = during.group(1)
+
+    return filters
+
+
+def filters_key(filters: Optional[Dict]) -> str:
+    """Canonical, hashable form of a filter dict for cache keys and grouping."""
+    return json.dumps(filters or {}, sort_keys=True, default=list)
@@ -0,0 +1,37 @@
+"""Index manifest: per-trial content fingerprints kept beside the Chroma store."""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+import json
+import os
+
+
+def manifest_path(persist_directory: str) -> Path:
+    """Return the manifest location for a Chroma persist directory."""
+    persist_path = Path(persist_directory)
+    return persist_path.parent / f"{persist_path.name}_manifest.json"
+
+
+def load_manifest(persist_directory: str) -> Dict:
+    """Load the manifest, or an empty one if the index was never built."""
+    path = manifest_path(persist_directory)
+    if not path.exists():
+        return {"version": 0, "trials": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(persist_directory: str, trials: Dict[str, str], previous_version: int = 0) -> Dict:
+    """Atomically write the manifest mapping trial id -> content hash."""
+    manifest = {
+        "version": previous_version + 1,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "trials": trials,
+    }
+    path = manifest_path(persist_directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    return manifest
@@ -0,0 +1,235 @@
+"""Process-wide pool of shared assistants for multi-session apps.
+
+Every Streamlit session (browser tab) used to build its own assistant, each
+with a Chroma client, embedding model, LLM client and caches. The pool
+keeps one ``SharedAssistant`` per configuration for the whole process:
+
+- concurrent calls are limited by a semaphore (``max_concurrency``); callers
+  wait up to ``acquire_timeout`` seconds for a slot
+- a health check (startup finished without error, collection reachable)
+  runs at most every ``health_check_interval`` seconds before a call, and a
+  failed assistant is rebuilt in place, so sessions holding the shared
+  object recover without reconnecting
+"""
+from typing import Callable, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+
+from .assistant import ClinicalTrialAssistant
+
+
+class _SlotStream:
+    """
+    Answer stream that gives its concurrency slot back exactly once.
+
+    The slot is released when the stream ends or fails, on ``close()``, or
+    when the stream is garbage collected unread (e.g. a Streamlit rerun
+    dropped it), so abandoned streams cannot leak slots.
+    """
+
+    def __init__(self, stream, release: Callable):
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+        self._stream = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        close = getattr(self._stream, "close", None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            self._release()
+
+    def __del__(self):
+        self.close()
+
+
+class SharedAssistant:
+    """Thread-safe front for one assistant shared by many sessions."""
+
+    def __init__(self, factory: Callable, max_concurrency: int = 8, acquire_timeout: Optional[float] = 30,
+                 health_check_interval: float = 60):
+        self.factory = factory
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.replacements = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._healthy = True
+        self._checking = False
+        self._checked_at = time.monotonic()
+        self._assistant = factory()
+
+    @property
+    def assistant(self):
+        """The current underlying assistant, replaced if a health check failed."""
+        self._check_health()
+        return self._assistant
+
+    def _check_health(self):
+        # Probing and rebuilding can take seconds; they run outside the lock that
+        # every call needs, and only one thread checks at a time
+        with self._lock:
+            if self._checking or (time.monotonic() - self._checked_at < self.health_check_interval
+                                  and self._healthy):
+                return
+            self._checking = True
+            self._checked_at = time.monotonic()
+            assistant = self._assistant
+        try:
+            healthy = self._probe(assistant)
+            if not healthy:
+                print("Shared assistant failed its health check; rebuilding it")
+                replacement = self.factory()
+                with self._lock:
+                    self._assistant = replacement
+                    self.replacements += 1
+            with self._lock:
+                self._healthy = True
+        except BaseException:
+            with self._lock:
+                self._healthy = False
+            raise
+        finally:
+            with self._lock:
+                self._checking = False
+
+    @staticmethod
+    def _probe(assistant) -> bool:
+        """True if the assistant is still starting or can reach its collection."""
+        if hasattr(assistant, "ready") and not assistant.ready():
+            return True
+        try:
+            if hasattr(assistant, "wait_until_ready"):
+                assistant.wait_until_ready()
+            collection = getattr(assistant, "collection", None)
+            if collection is not None:
+                collection.count()
+            return True
+        except Exception as e:
+            print(f"Assistant health check failed: {e}")
+            return False
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"All {self.max_concurrency} assistant slots are busy; try again shortly")
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def query(self, *args, **kwargs) -> Dict:
+        assistant = self.assistant
+        self._acquire()
+        try:
+            return assistant.query(*args, **kwargs)
+        finally:
+            self._release()
+
+    def query_batch(self, *args, **kwargs):
+        assistant = self.assistant
+        self._acquire()
+        try:
+            return assistant.query_batch(*args, **kwargs)
+        finally:
+            self._release()
+
+    def query_stream(self, *args, **kwargs) -> Dict:
+        """Like ``assistant.query_stream``; the slot is held until the answer stream ends."""
+        assistant = self.assistant
+        self._acquire()
+        try:
+            response = assistant.query_stream(*args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+        response["answer_stream"] = _SlotStream(response["answer_stream"], self._release)
+        return response
+
+    async def aquery(self, *args, **kwargs) -> Dict:
+        assistant = self.assistant
+        await asyncio.get_running_loop().run_in_executor(None, self._acquire)
+        try:
+            return await assistant.aquery(*args, **kwargs)
+        finally:
+            self._release()
+
+    def health(self) -> Dict:
+        """Pool status for dashboards: health, slots in use and rebuild count."""
+        self._check_health()
+        with self._lock:
+            return {
+                "healthy": self._healthy,
+                "ready": getattr(self._assistant, "ready", lambda: True)(),
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "replacements": self.replacements,
+            }
+
+    def __getattr__(self, name):
+        # Everything else (collection, cache_stats, ...) comes from the current assistant
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.assistant, name)
+
+
+class AssistantPool:
+    """One ``SharedAssistant`` per distinct set of constructor arguments."""
+
+    def __init__(self, factory: Callable = ClinicalTrialAssistant, max_concurrency: Optional[int] = None,
+                 acquire_timeout: Optional[float] = 30, health_check_interval: float = 60):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("ASSISTANT_MAX_CONCURRENCY", 8))
+        self.factory = factory
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._assistants: Dict[tuple, SharedAssistant] = {}
+        self._lock = threading.Lock()
+
+    def get(self, **kwargs) -> SharedAssistant:
+        """Return the shared assistant for these constructor arguments, creating it once."""
+        key = tuple(sorted(kwargs.items()))
+        with self._lock:
+            shared = self._assistants.get(key)
+            if shared is None:
+                shared = self._assistants[key] = SharedAssistant(
+                    lambda: self.factory(**kwargs), self.max_concurrency, self.acquire_timeout,
+                    self.health_check_interval)
+            return shared
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_shared_assistant(**kwargs) -> SharedAssistant:
+    """The process-wide shared assistant for ``ClinicalTrialAssistant(**kwargs)``."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = AssistantPool()
+    return _default_pool.get(**kwargs)
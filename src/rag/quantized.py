@@ -0,0 +1,219 @@
+"""Quantized vector index: a compact first stage for vector search, rescored in full precision.
+
+Chroma keeps its own float32 HNSW index in memory once it is queried. This
+index instead keeps trial embeddings as
+
+- ``float16``: half-precision rows (2 bytes per dimension)
+- ``int8``: per-dimension scalar quantization (1 byte per dimension)
+- ``pq``: product quantization, one byte per ``pq_subvectors`` subspace
+
+in memory-mapped ``.npy`` files. A query scores all codes in chunks; the
+best ``rescore_k`` candidates are then rescored exactly with their float32
+vectors from the embedding cache (only those rows are read from disk).
+Distances are squared L2 between normalized vectors, as Chroma reports them.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import shutil
+import numpy as np
+
+from .bm25 import _swap_directory
+from .embedding_cache import EmbeddingCache
+
+QUANTIZATION_MODES = ("float16", "int8", "pq")
+
+
+def quantized_path(persist_directory: str) -> Path:
+    """Return the quantized vector index location for a Chroma persist directory."""
+    persist_path = Path(persist_directory)
+    return persist_path.parent / f"{persist_path.name}_quantized"
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _kmeans(points: np.ndarray, k: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means; returns ``k`` centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=k, replace=len(points) < k)].copy()
+    for _ in range(iterations):
+        # ||p||^2 is the same for every centroid, so it does not change the argmin
+        assignment = ((centroids * centroids).sum(1) - 2 * points @ centroids.T).argmin(axis=1)
+        order = np.argsort(assignment, kind="stable")
+        filled, starts, counts = np.unique(assignment[order], return_index=True, return_counts=True)
+        centroids[filled] = np.add.reduceat(points[order], starts, axis=0) / counts[:, None]
+    return centroids
+
+
+def _iter_chunks(n: int, chunk_size: int):
+    for start in range(0, n, chunk_size):
+        yield start, min(start + chunk_size, n)
+
+
+def build_quantized_index(directory: Path, ids: Sequence[str], cache: EmbeddingCache, cache_rows: np.ndarray,
+                          mode: str = "int8", pq_subvectors: int = 48, train_size: int = 10000,
+                          chunk_size: int = 65536) -> Path:
+    """
+    Quantize the cached embeddings of ``ids`` and write the index.
+
+    ``cache_rows`` gives each trial's row in ``cache``, which is also where
+    queries read full-precision vectors for rescoring.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+    directory = Path(directory)
+    cache_rows = np.asarray(cache_rows, dtype=np.int64)
+    n, dim = len(cache_rows), cache.dim or 0
+
+    def vectors(start, end):
+        return _normalize_rows(cache.get(cache_rows[start:end]))
+
+    params = {}
+    if mode == "float16":
+        codes = np.zeros((n, dim), dtype=np.float16)
+        for start, end in _iter_chunks(n, chunk_size):
+            codes[start:end] = vectors(start, end)
+    elif mode == "int8":
+        low = np.full(dim, np.inf, dtype=np.float32)
+        high = np.full(dim, -np.inf, dtype=np.float32)
+        for start, end in _iter_chunks(n, chunk_size):
+            chunk = vectors(start, end)
+            low, high = np.minimum(low, chunk.min(0)), np.maximum(high, chunk.max(0))
+        scale = np.where(high > low, (high - low) / 255.0, 1.0).astype(np.float32)
+        codes = np.zeros((n, dim), dtype=np.uint8)
+        for start, end in _iter_chunks(n, chunk_size):
+            codes[start:end] = np.clip(np.rint((vectors(start, end) - low) / scale), 0, 255)
+        params = {"scale": scale, "offset": low}
+    else:
+        if dim % pq_subvectors:
+            raise ValueError(f"Dimension {dim} is not divisible by {pq_subvectors} subvectors")
+        sub_dim = dim // pq_subvectors
+        sample_rows = np.sort(np.random.default_rng(0).choice(n, size=min(n, train_size), replace=False))
+        sample = _normalize_rows(cache.get(cache_rows[sample_rows]))
+        codebooks = np.stack([
+            _kmeans(sample[:, j * sub_dim:(j + 1) * sub_dim], min(256, len(sample)))
+            for j in range(pq_subvectors)
+        ]).astype(np.float32)
+        codes = np.zeros((n, pq_subvectors), dtype=np.uint8)
+        for start, end in _iter_chunks(n, chunk_size):
+            chunk = vectors(start, end)
+            for j in range(pq_subvectors):
+                sub = chunk[:, j * sub_dim:(j + 1) * sub_dim]
+                book = codebooks[j]
+                codes[start:end, j] = ((book * book).sum(1) - 2 * sub @ book.T).argmin(axis=1)
+        params = {"codebooks": codebooks}
+
+    ids = np.array(list(ids), dtype=str)
+    sorted_rows = np.argsort(ids, kind="stable").astype(np.int64)
+    tmp_directory = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    tmp_directory.mkdir(parents=True)
+    np.save(tmp_directory / "codes.npy", codes)
+    np.save(tmp_directory / "ids.npy", ids)
+    np.save(tmp_directory / "sorted_ids.npy", ids[sorted_rows])
+    np.save(tmp_directory / "sorted_rows.npy", sorted_rows)
+    np.save(tmp_directory / "cache_rows.npy", cache_rows)
+    for name, value in params.items():
+        np.save(tmp_directory / f"{name}.npy", value)
+    with open(tmp_directory / "meta.json", "w") as f:
+        json.dump({"mode": mode, "dim": dim, "count": n, "model": cache.model}, f)
+    _swap_directory(tmp_directory, directory)
+    return directory
+
+
+class QuantizedIndex:
+    """Read-only quantized index over memory-mapped codes."""
+
+    def __init__(self, directory: Path, cache_root: Optional[Path] = None, chunk_size: int = 65536):
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            self.meta = json.load(f)
+        self.mode = self.meta["mode"]
+        self.chunk_size = chunk_size
+        self.codes = np.load(directory / "codes.npy", mmap_mode="r")
+        self.ids = np.load(directory / "ids.npy", mmap_mode="r")
+        self.sorted_ids = np.load(directory / "sorted_ids.npy", mmap_mode="r")
+        self.sorted_rows = np.load(directory / "sorted_rows.npy", mmap_mode="r")
+        self.cache_rows = np.load(directory / "cache_rows.npy", mmap_mode="r")
+        if self.mode == "int8":
+            self.scale = np.load(directory / "scale.npy")
+            self.offset = np.load(directory / "offset.npy")
+        elif self.mode == "pq":
+            self.codebooks = np.load(directory / "codebooks.npy")
+        # Full-precision vectors for rescoring; without them the quantized scores are final
+        self.cache = EmbeddingCache(cache_root, self.meta["model"]) if cache_root is not None else None
+        if self.cache is not None and not self.cache.count:
+            self.cache = None
+
+    @classmethod
+    def load(cls, directory: Path, cache_root: Optional[Path] = None) -> Optional["QuantizedIndex"]:
+        """Open the index, or return None if it has not been built; ``cache_root`` enables rescoring."""
+        if not (Path(directory) / "meta.json").exists():
+            return None
+        return cls(directory, cache_root)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows_for(self, trial_ids: Sequence[str]) -> np.ndarray:
+        """Row numbers of the given trial ids; unknown ids are dropped."""
+        trial_ids = np.array(list(trial_ids), dtype=str)
+        if not len(trial_ids) or not len(self.sorted_ids):
+            return np.zeros(0, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_ids, trial_ids), len(self.sorted_ids) - 1)
+        found = self.sorted_ids[positions] == trial_ids
+        return np.asarray(self.sorted_rows[positions[found]])
+
+    def _scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate inner products of ``query`` with a block of codes."""
+        if self.mode == "float16":
+            return codes.astype(np.float32) @ query
+        if self.mode == "int8":
+            return codes.astype(np.float32) @ (query * self.scale) + float(self.offset @ query)
+        # Product quantization: sum per-subspace lookup tables
+        m, _, sub_dim = self.codebooks.shape
+        tables = np.einsum("mkd,md->mk", self.codebooks, query.reshape(m, sub_dim))
+        return tables[np.arange(m), codes].sum(axis=1)
+
+    def search(self, query_embedding, top_k: int = 10, allowed_rows: Optional[np.ndarray] = None,
+               rescore_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (trial id, distance) pairs, nearest first."""
+        query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32).ravel())
+        n = len(self.ids)
+        if not n or top_k <= 0:
+            return []
+        rescore_k = max(rescore_k or 4 * top_k, top_k)
+
+        if allowed_rows is not None:
+            rows = np.unique(np.asarray(allowed_rows, dtype=np.int64))
+            scores = np.zeros(len(rows), dtype=np.float32)
+            for start, end in _iter_chunks(len(rows), self.chunk_size):
+                scores[start:end] = self._scores(query, np.asarray(self.codes[rows[start:end]]))
+        else:
+            rows = None
+            scores = np.empty(n, dtype=np.float32)
+            for start, end in _iter_chunks(n, self.chunk_size):
+                scores[start:end] = self._scores(query, self.codes[start:end])
+        if not len(scores):
+            return []
+
+        keep = min(rescore_k, len(scores))
+        candidates = np.argpartition(-scores, keep - 1)[:keep]
+        candidate_rows = rows[candidates] if rows is not None else candidates
+        if self.cache is not None:
+            order = np.argsort(candidate_rows)  # read rows in disk order
+            exact = _normalize_rows(self.cache.get(np.asarray(self.cache_rows[candidate_rows[order]])))
+            candidate_scores = np.empty(keep, dtype=np.float32)
+            candidate_scores[order] = exact @ query
+        else:
+            candidate_scores = scores[candidates]
+        best = np.argsort(-candidate_scores)[:top_k]
+        return [(str(self.ids[candidate_rows[i]]), float(2.0 - 2.0 * candidate_scores[i])) for i in best]
+
+    def stats(self) -> Dict:
+        return {"mode": self.mode, "count": len(self.ids), "code_bytes": int(self.codes.nbytes),
+                "rescoring": self.cache is not None}
@@ -0,0 +1,157 @@
+"""Second-stage reranking of over-fetched retrieval candidates.
+
+Retrieval over-fetches (``RerankStage.candidates`` hits) and a reranker
+rescores them as one batch; only the best ``n_results`` reach the prompt.
+A reranker is any object with ``score(question, documents, prior)``
+returning one score per document (higher is better), where ``prior`` is
+the first-stage relevance in [0, 1], best first.
+"""
+from typing import Dict, Optional, Sequence
+import importlib.util
+import threading
+import time
+import numpy as np
+
+from .bm25 import tokenize
+
+# Optional cross-encoder support (sentence-transformers pulls in torch, so it is imported on use)
+CROSS_ENCODER_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+
+
+def rank_prior(n: int) -> np.ndarray:
+    """First-stage relevance from rank alone: 1.0 for the top hit down to ~0 for the last."""
+    if n <= 1:
+        return np.ones(n, dtype=np.float32)
+    return 1.0 - np.arange(n, dtype=np.float32) / n
+
+
+class LexicalReranker:
+    """
+    CPU-only reranker: query-term coverage blended with the first-stage rank.
+
+    Coverage is the IDF-weighted share of distinct query terms found in a
+    candidate (IDF over the candidate set), with terms in the title line
+    counting ``title_weight`` times. Everything runs on one
+    candidates x terms matrix.
+    """
+
+    def __init__(self, prior_weight: float = 0.5, title_weight: float = 2.0):
+        self.prior_weight = prior_weight
+        self.title_weight = title_weight
+
+    def score(self, question: str, documents: Sequence[str], prior: np.ndarray) -> np.ndarray:
+        terms = sorted(set(tokenize(question)))
+        if not terms or not len(documents):
+            return np.asarray(prior, dtype=np.float32)
+
+        term_index = {term: j for j, term in enumerate(terms)}
+        in_body = np.zeros((len(documents), len(terms)), dtype=bool)
+        in_title = np.zeros_like(in_body)
+        for i, document in enumerate(documents):
+            title, _, body = document.partition("\n")
+            for term in set(tokenize(title)):
+                j = term_index.get(term)
+                if j is not None:
+                    in_title[i, j] = True
+            for term in set(tokenize(body)):
+                j = term_index.get(term)
+                if j is not None:
+                    in_body[i, j] = True
+
+        present = in_body | in_title
+        idf = np.log1p(len(documents) / (1.0 + present.sum(axis=0)))
+        weights = present + (self.title_weight - 1.0) * in_title
+        coverage = (weights @ idf) / (self.title_weight * idf.sum() or 1.0)
+        return (self.prior_weight * np.asarray(prior, dtype=np.float32)
+                + (1.0 - self.prior_weight) * coverage.astype(np.float32))
+
+
+class CrossEncoderReranker:
+    """Reranker backed by a sentence-transformers cross-encoder (optional dependency)."""
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 32):
+        if not CROSS_ENCODER_AVAILABLE:
+            raise ImportError("sentence-transformers is required for CrossEncoderReranker")
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name)
+        self.batch_size = batch_size
+
+    def score(self, question: str, documents: Sequence[str], prior: np.ndarray) -> np.ndarray:
+        pairs = [(question, document) for document in documents]
+        return np.asarray(self.model.predict(pairs, batch_size=self.batch_size), dtype=np.float32)
+
+
+def get_reranker(name: Optional[str]):
+    """Build a reranker by name: ``"lexical"``, ``"cross-encoder"`` or ``None``/``"none"``."""
+    if name is None or name == "none":
+        return None
+    if name == "lexical":
+        return LexicalReranker()
+    if name == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown reranker: {name}")
+
+
+class RerankStage:
+    """
+    Applies a reranker to retrieval hits within a latency budget.
+
+    ``budget_ms`` bounds the time spent retrieving plus reranking one
+    batch of questions. A question is reranked only if the time already
+    spent plus the expected rerank time (a running average) fits in the
+    budget; otherwise its first-stage order is kept.
+    """
+
+    def __init__(self, reranker, candidates: int = 50, budget_ms: Optional[float] = None):
+        self.reranker = reranker
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+        self.reranked = 0
+        self.skipped = 0
+        self._average_ms = 0.0
+        self._lock = threading.Lock()
+
+    def rerank(self, question: str, hits: Dict, n_results: int, started: Optional[float] = None) -> Dict:
+        """Return ``hits`` reordered and cut to ``n_results``; ``started`` is a ``perf_counter`` time."""
+        count = len(hits["ids"])
+        if count <= 1 or not self._within_budget(started):
+            with self._lock:
+                self.skipped += count > 1
+            return select_hits(hits, range(min(count, n_results)))
+
+        start = time.perf_counter()
+        # Documents do not contain the NCT number; put it on the title line so id queries can match
+        texts = [f"{trial_id} {document}" for trial_id, document in zip(hits["ids"], hits["documents"])]
+        scores = self.reranker.score(question, texts, rank_prior(count))
+        order = np.argsort(-np.asarray(scores), kind="stable")[:n_results]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.reranked += 1
+            self._average_ms += (elapsed_ms - self._average_ms) / min(self.reranked, 20)
+
+        reranked = select_hits(hits, order)
+        reranked["rerank_scores"] = [float(scores[i]) for i in order]
+        return reranked
+
+    def _within_budget(self, started: Optional[float]) -> bool:
+        if self.budget_ms is None or started is None:
+            return True
+        spent_ms = (time.perf_counter() - started) * 1000
+        return spent_ms + self._average_ms <= self.budget_ms
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "reranked": self.reranked,
+                "skipped": self.skipped,
+                "avg_ms": self._average_ms,
+                "candidates": self.candidates,
+                "budget_ms": self.budget_ms,
+            }
+
+
+def select_hits(hits: Dict, positions) -> Dict:
+    """Select ``positions`` (in that order) from every per-hit list in a hits dict."""
+    positions = list(positions)
+    return {key: [values[i] for i in positions] for key, values in hits.items() if isinstance(values, list)}
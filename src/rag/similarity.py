@@ -0,0 +1,199 @@
+"""Precomputed trial-to-trial similarity: corpus TF-IDF rows and a top-k neighbor table.
+
+Built at index time next to the Chroma store from each trial's title,
+conditions and primary purpose, then stored as ``.npy`` files that are
+memory-mapped on load:
+
+- ``indptr``/``indices``/``data``: L2-normalized TF-IDF rows in CSR layout,
+  so the cosine similarity of two trials is a sparse row dot product
+- ``neighbors``/``neighbor_scores``: the ``k`` most similar trials per row
+  (candidates from pruned postings, see ``SimilarityBuilder``)
+- ``ids`` plus ``sorted_ids``/``sorted_rows`` to find a trial's row by
+  binary search
+"""
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import shutil
+import numpy as np
+
+from .bm25 import _swap_directory, tokenize
+
+
+def similarity_path(persist_directory: str) -> Path:
+    """Return the similarity index location for a Chroma persist directory."""
+    persist_path = Path(persist_directory)
+    return persist_path.parent / f"{persist_path.name}_similarity"
+
+
+def trial_text(metadata: Dict) -> str:
+    """Text a trial is compared on: brief title, conditions and primary purpose."""
+    return f"{metadata.get('brief_title', '')} {metadata.get('condition', '')} {metadata.get('purpose', '')}"
+
+
+class SimilarityBuilder:
+    """
+    Accumulates term counts batch by batch and writes the similarity index.
+
+    Neighbor candidates come from an inverted index that keeps, per term,
+    only the ``max_postings`` trials where the term weighs most; walking the
+    full postings of common terms would be quadratic in the corpus size.
+    Stored neighbor scores are therefore approximate, and
+    ``SimilarityIndex.most_similar`` rescores them exactly.
+    """
+
+    def __init__(self, neighbors: int = 10, max_postings: int = 200, block_size: int = 256):
+        self.neighbors = neighbors
+        self.max_postings = max_postings
+        self.block_size = block_size
+        self._vocab: Dict[str, int] = {}
+        self._indptr = array("q", [0])
+        self._terms = array("I")
+        self._counts = array("H")
+        self._ids: List[str] = []
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict]):
+        """Add a batch of trials; ``documents`` are unused, the metadata fields are compared."""
+        for trial_id, metadata in zip(ids, metadatas):
+            counts = Counter(tokenize(trial_text(metadata)))
+            for term in sorted(counts, key=lambda term: self._vocab.setdefault(term, len(self._vocab))):
+                self._terms.append(self._vocab[term])
+                self._counts.append(min(counts[term], 65535))
+            self._indptr.append(len(self._terms))
+            self._ids.append(trial_id)
+
+    def save(self, directory: Path):
+        """Compute TF-IDF rows and neighbors, replacing any previous index as a whole."""
+        directory = Path(directory)
+        n_docs = len(self._ids)
+        indptr = np.frombuffer(self._indptr, dtype=np.int64)
+        indices = np.frombuffer(self._terms, dtype=np.uint32)
+        df = np.bincount(indices, minlength=len(self._vocab))
+        idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+        data = (1.0 + np.log(np.frombuffer(self._counts, dtype=np.uint16).astype(np.float32))) * idf[indices]
+        row_of = np.repeat(np.arange(n_docs), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=data * data, minlength=n_docs))
+        data = (data / np.where(norms > 0, norms, 1.0)[row_of]).astype(np.float32)
+
+        neighbors, neighbor_scores = self._neighbors(indptr, indices, data, df)
+
+        ids = np.array(self._ids, dtype=str)
+        sorted_rows = np.argsort(ids, kind="stable").astype(np.int64)
+        tmp_directory = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        tmp_directory.mkdir(parents=True)
+        np.save(tmp_directory / "indptr.npy", indptr)
+        np.save(tmp_directory / "indices.npy", indices)
+        np.save(tmp_directory / "data.npy", data)
+        np.save(tmp_directory / "ids.npy", ids)
+        np.save(tmp_directory / "sorted_ids.npy", ids[sorted_rows])
+        np.save(tmp_directory / "sorted_rows.npy", sorted_rows)
+        np.save(tmp_directory / "neighbors.npy", neighbors)
+        np.save(tmp_directory / "neighbor_scores.npy", neighbor_scores)
+        with open(tmp_directory / "meta.json", "w") as f:
+            json.dump({"documents": n_docs, "terms": len(self._vocab), "neighbors": self.neighbors}, f)
+        _swap_directory(tmp_directory, directory)
+
+    def _neighbors(self, indptr, indices, data, df) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k neighbors per row by sparse products over an inverted index, a block of rows at a time."""
+        n_docs, k = len(self._ids), self.neighbors
+        neighbors = np.full((n_docs, k), -1, dtype=np.int32)
+        neighbor_scores = np.zeros((n_docs, k), dtype=np.float32)
+        if not n_docs or not k:
+            return neighbors, neighbor_scores
+
+        # Inverted index (term -> rows, weights), pruned to each term's heaviest postings
+        row_of = np.repeat(np.arange(n_docs), np.diff(indptr))
+        by_term = np.lexsort((-data, indices))
+        rank = np.arange(len(by_term)) - np.searchsorted(indices[by_term], indices[by_term], side="left")
+        by_term = by_term[rank < self.max_postings]
+        posting_rows = row_of[by_term]
+        posting_data = data[by_term]
+        term_offsets = np.zeros(len(df) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices[by_term], minlength=len(df)), out=term_offsets[1:])
+
+        for block_start in range(0, n_docs, self.block_size):
+            block_end = min(block_start + self.block_size, n_docs)
+            start, end = indptr[block_start], indptr[block_end]
+            block_rows = row_of[start:end]
+            block_terms = indices[start:end]
+            block_data = data[start:end]
+
+            # Expand every (row, term) entry of the block into that term's postings
+            lengths = term_offsets[block_terms + 1] - term_offsets[block_terms]
+            source = np.repeat(np.arange(len(block_terms)), lengths)
+            positions = np.repeat(term_offsets[block_terms] - np.cumsum(lengths) + lengths, lengths) \
+                + np.arange(lengths.sum())
+            pair_rows = block_rows[source]
+            pair_others = posting_rows[positions]
+            not_self = pair_rows != pair_others
+            pair_keys = pair_rows[not_self].astype(np.int64) * n_docs + pair_others[not_self]
+            pair_weights = (block_data[source] * posting_data[positions])[not_self]
+
+            keys, inverse = np.unique(pair_keys, return_inverse=True)
+            scores = np.bincount(inverse, weights=pair_weights).astype(np.float32)
+            rows, others = keys // n_docs, keys % n_docs
+            order = np.lexsort((-scores, rows))
+            rows, others, scores = rows[order], others[order], scores[order]
+            group_starts = np.searchsorted(rows, rows, side="left")
+            rank = np.arange(len(rows)) - group_starts
+            top = rank < k
+            neighbors[rows[top], rank[top]] = others[top]
+            neighbor_scores[rows[top], rank[top]] = scores[top]
+
+        return neighbors, neighbor_scores
+
+
+class SimilarityIndex:
+    """Read-only similarity index over memory-mapped arrays."""
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        self.indptr = np.load(directory / "indptr.npy", mmap_mode="r")
+        self.indices = np.load(directory / "indices.npy", mmap_mode="r")
+        self.data = np.load(directory / "data.npy", mmap_mode="r")
+        self.ids = np.load(directory / "ids.npy", mmap_mode="r")
+        self.sorted_ids = np.load(directory / "sorted_ids.npy", mmap_mode="r")
+        self.sorted_rows = np.load(directory / "sorted_rows.npy", mmap_mode="r")
+        self.neighbors = np.load(directory / "neighbors.npy", mmap_mode="r")
+        self.neighbor_scores = np.load(directory / "neighbor_scores.npy", mmap_mode="r")
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["SimilarityIndex"]:
+        """Open the index, or return None if it has not been built."""
+        if not (Path(directory) / "meta.json").exists():
+            return None
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, trial_id: str) -> Optional[int]:
+        """Row number of a trial, or None if it is not indexed."""
+        position = int(np.searchsorted(self.sorted_ids, trial_id))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == trial_id:
+            return int(self.sorted_rows[position])
+        return None
+
+    def similarity(self, trial_id: str, other_id: str) -> Optional[float]:
+        """Cosine similarity of two trials' TF-IDF rows, or None if either is unknown."""
+        row, other = self.row(trial_id), self.row(other_id)
+        if row is None or other is None:
+            return None
+        terms = self.indices[self.indptr[row]:self.indptr[row + 1]]
+        other_terms = self.indices[self.indptr[other]:self.indptr[other + 1]]
+        _, mine, theirs = np.intersect1d(terms, other_terms, assume_unique=True, return_indices=True)
+        weights = self.data[self.indptr[row]:self.indptr[row + 1]][mine]
+        other_weights = self.data[self.indptr[other]:self.indptr[other + 1]][theirs]
+        return float(np.dot(weights, other_weights))
+
+    def most_similar(self, trial_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """The most similar trials from the neighbor table as (trial id, exact score), best first."""
+        row = self.row(trial_id)
+        if row is None:
+            return []
+        neighbor_ids = [str(self.ids[other]) for other in self.neighbors[row] if other >= 0]
+        scored = [(other_id, self.similarity(trial_id, other_id)) for other_id in neighbor_ids]
+        return sorted(scored, key=lambda item: item[1], reverse=True)[:k]
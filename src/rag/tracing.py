@@ -0,0 +1,92 @@
+"""Low-overhead latency spans with in-process percentile summaries.
+
+``Tracer.span(name)`` times a block with ``time.perf_counter`` and records
+the duration (ms) into that stage's histogram. Histograms keep the most
+recent ``window`` samples, so p50/p95/p99 follow current behaviour, plus
+all-time count, mean and max. Pass a dict as ``timings`` to also add the
+duration to a per-request breakdown.
+"""
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+import threading
+import time
+import numpy as np
+
+
+class LatencyHistogram:
+    """Recent latency samples of one stage."""
+
+    def __init__(self, window: int = 2048):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def summary(self) -> Dict:
+        p50, p95, p99 = np.percentile(self.samples, [50, 95, 99]) if self.samples else (0.0, 0.0, 0.0)
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": self.max_ms,
+        }
+
+
+class Tracer:
+    """Per-stage latency histograms, safe to share between threads."""
+
+    def __init__(self, enabled: bool = True, window: int = 2048):
+        self.enabled = enabled
+        self.window = window
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, timings: Optional[Dict] = None):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, timings)
+
+    def record(self, name: str, ms: float, timings: Optional[Dict] = None):
+        """Record a duration measured elsewhere."""
+        if not self.enabled:
+            return
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + ms
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram(self.window)
+            histogram.record(ms)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Count, mean, p50/p95/p99 and max (ms) per stage."""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def format_stats(stats: Dict[str, Dict]) -> str:
+    """Render ``Tracer.stats()`` as a plain-text table."""
+    lines = [f"{'stage':<16} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"]
+    for name, summary in stats.items():
+        lines.append(f"{name:<16} {summary['count']:>7} {summary['mean_ms']:>9.1f} {summary['p50_ms']:>9.1f} "
+                     f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['max_ms']:>9.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,124 @@
+"""Headless HTTP query service for running the assistant behind a load balancer.
+
+Endpoints:
+
+- ``POST /query`` with ``{"question": ..., "n_results": 3, "filters": {...}}``
+  returns the ``query`` result as JSON
+- ``GET /healthz``: the process is up (liveness)
+- ``GET /readyz``: the index and LLM are loaded and healthy (readiness);
+  503 until then
+- ``GET /stats``: batching, cache, pool and per-stage latency counters
+
+Concurrent queries are micro-batched (see ``rag.batching``). Run with:
+    python -m src.ui.server
+configured by ``SERVER_HOST``, ``SERVER_PORT``, ``BATCH_MAX_SIZE``,
+``BATCH_MAX_WAIT_MS`` and ``SERVER_MAX_PENDING``.
+
+Malformed requests (unknown filters, impossible dates, ``n_results`` outside
+1..``MAX_N_RESULTS``) get a 400; when ``SERVER_MAX_PENDING`` queries are
+already waiting, new ones get a 503 instead of queueing without bound.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.rag.batching import MicroBatcher, QueueFullError
+from src.rag.filters import validate_filters
+from src.rag.pool import get_shared_assistant
+
+# Longest a request waits for its answer before the server gives up on it
+QUERY_TIMEOUT = 60
+# Most trials one request may retrieve
+MAX_N_RESULTS = 50
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server_version = "ClinicalTrialAssistant/1.0"
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        assistant = self.server.assistant
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/readyz":
+            health = assistant.health()
+            ready = health["healthy"] and health["ready"]
+            self._send_json(200 if ready else 503, {"status": "ready" if ready else "starting", **health})
+        elif self.path == "/stats":
+            self._send_json(200, {
+                "batching": self.server.batcher.stats(),
+                "pool": assistant.health(),
+                "cache": assistant.cache_stats() if assistant.ready() else {},
+                "latency": assistant.latency_stats() if assistant.ready() else {},
+            })
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            question = request["question"]
+            n_results = request.get("n_results", 3)
+            if not isinstance(question, str) or not question.strip():
+                raise ValueError("question must be a non-empty string")
+            if isinstance(n_results, bool) or not isinstance(n_results, int) \
+                    or not 1 <= n_results <= MAX_N_RESULTS:
+                raise ValueError(f"n_results must be an integer from 1 to {MAX_N_RESULTS}")
+            filters = validate_filters(request.get("filters"))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            result = self.server.batcher.query(question, n_results, filters, timeout=QUERY_TIMEOUT)
+        except QueueFullError as e:
+            self._send_json(503, {"error": str(e)})
+            return
+        except TimeoutError as e:
+            self._send_json(503, {"error": str(e) or "Timed out waiting for an answer"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"Error generating response: {e}"})
+            return
+        self._send_json(200, result)
+
+
+def create_server(host: str = "0.0.0.0", port: int = 8000, assistant=None,
+                  max_batch_size: int = 32, max_wait_ms: float = 5, max_pending: int = 256) -> ThreadingHTTPServer:
+    """Build the HTTP server around a shared assistant (the process-wide one by default)."""
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.assistant = assistant if assistant is not None else get_shared_assistant()
+    server.batcher = MicroBatcher(server.assistant, max_batch_size=max_batch_size,
+                                  max_wait_ms=max_wait_ms, max_pending=max_pending)
+    return server
+
+
+if __name__ == "__main__":
+    host = os.getenv("SERVER_HOST", "0.0.0.0")
+    port = int(os.getenv("SERVER_PORT", 8000))
+    server = create_server(host, port,
+                           max_batch_size=int(os.getenv("BATCH_MAX_SIZE", 32)),
+                           max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", 5)),
+                           max_pending=int(os.getenv("SERVER_MAX_PENDING", 256)))
+    print(f"Serving clinical trial queries on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.batcher.close()
+        server.server_close()
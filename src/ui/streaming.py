@@ -0,0 +1,16 @@
+"""Streamlit rendering of streamed answers, shared by both Streamlit apps."""
+import streamlit as st
+
+
+def write_answer_stream(answer_stream) -> str:
+    """Render streamed answer tokens and return the full answer text."""
+    if hasattr(st, "write_stream"):
+        answer = st.write_stream(answer_stream)
+        return answer if isinstance(answer, str) else "".join(map(str, answer))
+    # Older Streamlit: update a placeholder as tokens arrive
+    placeholder = st.empty()
+    answer = ""
+    for token in answer_stream:
+        answer += token
+        placeholder.markdown(answer)
+    return answer